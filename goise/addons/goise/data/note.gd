@@ -7,12 +7,20 @@ class_name GoiseNote
 @export var end: float
 @export var effects: Array[GoiseEffect]
 
+# Absolute timestamps in seconds, with tempo changes and track delay applied.
+@export var time: float
+@export var end_time: float
+
 
 func _init(p_note: int = 0,
 			p_beat: float = 0.0,
 			p_end: float = 0.0,
-			p_effects: Array[GoiseEffect] = []):
+			p_effects: Array[GoiseEffect] = [],
+			p_time: float = 0.0,
+			p_end_time: float = 0.0):
 	note = p_note
 	beat = p_beat
 	end = p_end
 	effects = p_effects
+	time = p_time
+	end_time = p_end_time
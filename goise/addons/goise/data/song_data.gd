@@ -7,6 +7,19 @@ class_name GoiseSongData
 @export var lpb_map: Dictionary
 @export var tracks: Array[GoiseTrack]
 
+# Tempo segments, precomputed by renot from the bpm and lpb maps.
+# Each segment starts at a line and time, and runs at a fixed amount of lines per second.
+@export var tempo_lines: PackedFloat64Array
+@export var tempo_times: PackedFloat64Array
+@export var tempo_rates: PackedFloat64Array
+
+# Split songs only list their tracks, each in a resource file of its own,
+# which is loaded once someone listens to it and added to tracks.
+@export var track_names: PackedStringArray
+@export var track_paths: PackedStringArray
+
+var loaded_track_paths: Dictionary = {}
+
 
 func _init(p_song_path: String = "",
 			p_bpm_map: Dictionary = {},
@@ -18,9 +31,33 @@ func _init(p_song_path: String = "",
 	tracks = p_tracks
 
 
+func load_tracks(track_name: String):
+	# Loads the tracks of a split song with a name, which only has to happen once.
+	for i in range(track_names.size()):
+		if track_names[i] != track_name or track_paths[i] in loaded_track_paths:
+			continue
+		loaded_track_paths[track_paths[i]] = true
+		tracks.append(load(track_paths[i]) as GoiseTrack)
+
+
 func get_line(t: float) -> float:
-	# TODO - handle bpm adjusts
-	var bpm = bpm_map[0]
-	var bps = bpm / 60.0
-	var lpb = lpb_map[0]
-	return bps * t * lpb
+	if tempo_times.is_empty():
+		# Older resources only have a single tempo.
+		var bpm = bpm_map[0]
+		var bps = bpm / 60.0
+		var lpb = lpb_map[0]
+		return bps * t * lpb
+	
+	var i: int = maxi(tempo_times.bsearch(t, false) - 1, 0)
+	return tempo_lines[i] + (t - tempo_times[i]) * tempo_rates[i]
+
+
+func get_time(line: float) -> float:
+	if tempo_lines.is_empty():
+		var bpm = bpm_map[0]
+		var bps = bpm / 60.0
+		var lpb = lpb_map[0]
+		return line / (bps * lpb)
+	
+	var i: int = maxi(tempo_lines.bsearch(line, false) - 1, 0)
+	return tempo_times[i] + (line - tempo_lines[i]) / tempo_rates[i]
@@ -5,8 +5,83 @@ class_name GoiseTrack
 @export var name: String
 @export var notes: Array[GoiseNote]
 
+# Packed note data, used instead of notes by resources exported in the packed format.
+# The effects of note i are effects packed_effect_offsets[i] to packed_effect_offsets[i + 1],
+# and the params of effect j are params packed_effect_param_offsets[j] to packed_effect_param_offsets[j + 1].
+@export var packed_notes: PackedInt32Array
+@export var packed_beats: PackedFloat64Array
+@export var packed_ends: PackedFloat64Array
+@export var packed_times: PackedFloat64Array
+@export var packed_end_times: PackedFloat64Array
+@export var packed_effect_offsets: PackedInt32Array
+@export var packed_effect_types: PackedInt32Array
+@export var packed_effect_param_offsets: PackedInt32Array
+@export var packed_effect_params: PackedFloat64Array
+
+# Scheduling index over the notes, which are sorted by beat.
+# schedule_ends[i] is the latest end of notes 0 to i, where a note without an end ends at its beat.
+# Packed resources only export the ends, their beats are the packed beats.
+@export var schedule_beats: PackedFloat64Array
+@export var schedule_ends: PackedFloat64Array
+
 
 func _init(p_name: String = 'Track',
 			p_notes: Array[GoiseNote] = []):
 	name = p_name
 	notes = p_notes
+
+
+func is_packed() -> bool:
+	return notes.is_empty() and not packed_notes.is_empty()
+
+
+func unpack():
+	# Builds note resources out of the packed arrays, which only has to happen once.
+	if not is_packed():
+		return
+	
+	var unpacked: Array[GoiseNote] = []
+	for i in range(packed_notes.size()):
+		var effects: Array[GoiseEffect] = []
+		for j in range(packed_effect_offsets[i], packed_effect_offsets[i + 1]):
+			var params: Array[float] = []
+			for k in range(packed_effect_param_offsets[j], packed_effect_param_offsets[j + 1]):
+				params.append(packed_effect_params[k])
+			effects.append(GoiseEffect.new(packed_effect_types[j] as GoiseEffect.Type, params))
+		
+		unpacked.append(GoiseNote.new(
+			packed_notes[i],
+			packed_beats[i],
+			packed_ends[i],
+			effects,
+			packed_times[i],
+			packed_end_times[i],
+		))
+	notes = unpacked
+	schedule_beats = packed_beats
+
+
+func has_schedule() -> bool:
+	return schedule_beats.size() == notes.size() and schedule_ends.size() == notes.size()
+
+
+func build_schedule():
+	# Resources exported before the index existed get it built here.
+	if has_schedule():
+		return
+	
+	schedule_beats = PackedFloat64Array()
+	schedule_ends = PackedFloat64Array()
+	var latest: float = -INF
+	for note in notes:
+		var end: float = note.beat if note.end == 0.0 else max(note.beat, note.end)
+		latest = max(latest, end)
+		schedule_beats.append(note.beat)
+		schedule_ends.append(latest)
+
+
+func get_window(line: float, cue: float) -> Vector2i:
+	# Every note before the window has ended, every note after it hasn't been cued yet.
+	var lo: int = schedule_ends.bsearch(line, false)
+	var hi: int = schedule_beats.bsearch(line - cue, false)
+	return Vector2i(lo, max(lo, hi))
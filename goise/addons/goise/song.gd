@@ -11,6 +11,7 @@ var listeners: Dictionary = {}
 # State
 var last_t: float = 0.0
 var note_state: Dictionary = {}
+var live_notes: Dictionary = {}
 
 enum NoteState { WAIT, CUED, HIT, RELEASED } 
 
@@ -27,9 +28,11 @@ func destroy():
 func _process(delta):
 	var t: float = audio_stream_player.get_playback_position()
 	var line: float = song_data.get_line(t)
-	last_t = t
 	if last_t > t:
+		# Playback went back, so every note can be played again.
 		note_state = {}
+		live_notes = {}
+	last_t = t
 	
 	for track in song_data.tracks:
 		if track.name not in listeners:
@@ -38,49 +41,71 @@ func _process(delta):
 		for note_listener in listeners[track.name]:
 			if note_listener not in note_state:
 				note_state[note_listener] = {}
+				live_notes[note_listener] = {}
+			var states: Dictionary = note_state[note_listener]
+			# Live notes are indices into their track, and a listener may hear several tracks of its name.
+			var live_tracks: Dictionary = live_notes[note_listener]
+			if track not in live_tracks:
+				live_tracks[track] = {}
+			var live: Dictionary = live_tracks[track]
 			
-			for note in track.notes:
-				if note in note_state[note_listener]:
-					if note_state[note_listener][note] == NoteState.RELEASED:
-						continue
-				else:
-					note_state[note_listener][note] = NoteState.WAIT
-				
-				var zero_beat = note.beat + note_listener.cue
-				var one_beat = note.beat
-				var end_beat = 1.0
-				if note.end != 0.0:
-					end_beat = inverse_lerp(zero_beat, one_beat, note.end)
-				var beat_delta = inverse_lerp(zero_beat, one_beat, line)
-				
-				if beat_delta < 0:
-					# The note is not ready to be processed.
-					continue
-				elif beat_delta < 1.0:
-					# The note is ready to process.
-					if note_state[note_listener][note] == NoteState.WAIT:
-						note_state[note_listener][note] = NoteState.CUED
-						note_listener.start_note(note)
-					if note_state[note_listener][note] == NoteState.CUED:
-						note_listener.process_note(note, beat_delta, end_beat)
-				elif beat_delta < end_beat:
-					# The note has been hit.
-					if note_state[note_listener][note] == NoteState.CUED:
-						note_state[note_listener][note] = NoteState.HIT
-						note_listener.hit_note(note)
-					if note_state[note_listener][note] == NoteState.HIT:
-						note_listener.process_note(note, beat_delta, end_beat)
-				else:
-					# The note is ended.
-					if note_state[note_listener][note] == NoteState.CUED:
-						note_state[note_listener][note] = NoteState.RELEASED
-						note_listener.hit_note(note)
-						note_listener.process_note(note, end_beat, end_beat)
-						note_listener.release_note(note)
-					elif note_state[note_listener][note] == NoteState.HIT:
-						note_state[note_listener][note] = NoteState.RELEASED
-						note_listener.process_note(note, end_beat, end_beat)
-						note_listener.release_note(note)
+			# Only notes between their cue and end can change state,
+			# along with notes before them that were cued or hit and still have to be released.
+			var window: Vector2i = track.get_window(line, note_listener.cue)
+			var released: Array = live.values().filter(func(i): return i < window.x)
+			released.sort()
+			for i in released:
+				_process_note(note_listener, track.notes[i], i, line, states, live)
+			for i in range(window.x, window.y):
+				_process_note(note_listener, track.notes[i], i, line, states, live)
+
+
+func _process_note(note_listener: GoiseNoteListener, note: GoiseNote, index: int, line: float,
+		states: Dictionary, live: Dictionary):
+	if note in states:
+		if states[note] == NoteState.RELEASED:
+			return
+	else:
+		states[note] = NoteState.WAIT
+	
+	var zero_beat = note.beat + note_listener.cue
+	var one_beat = note.beat
+	var end_beat = 1.0
+	if note.end != 0.0:
+		end_beat = inverse_lerp(zero_beat, one_beat, note.end)
+	var beat_delta = inverse_lerp(zero_beat, one_beat, line)
+	
+	if beat_delta < 0:
+		# The note is not ready to be processed.
+		return
+	elif beat_delta < 1.0:
+		# The note is ready to process.
+		if states[note] == NoteState.WAIT:
+			states[note] = NoteState.CUED
+			live[note] = index
+			note_listener.start_note(note)
+		if states[note] == NoteState.CUED:
+			note_listener.process_note(note, beat_delta, end_beat)
+	elif beat_delta < end_beat:
+		# The note has been hit.
+		if states[note] == NoteState.CUED:
+			states[note] = NoteState.HIT
+			note_listener.hit_note(note)
+		if states[note] == NoteState.HIT:
+			note_listener.process_note(note, beat_delta, end_beat)
+	else:
+		# The note is ended.
+		if states[note] == NoteState.CUED:
+			states[note] = NoteState.RELEASED
+			live.erase(note)
+			note_listener.hit_note(note)
+			note_listener.process_note(note, end_beat, end_beat)
+			note_listener.release_note(note)
+		elif states[note] == NoteState.HIT:
+			states[note] = NoteState.RELEASED
+			live.erase(note)
+			note_listener.process_note(note, end_beat, end_beat)
+			note_listener.release_note(note)
 
 
 """
@@ -104,6 +129,13 @@ func attach_listener(listener: GoiseNoteListener):
 	var inst_name = listener.inst_name
 	if inst_name not in listeners:
 		listeners[inst_name] = []
+		# Split songs only load a track once someone listens to it,
+		# and packed tracks only build their notes then.
+		song_data.load_tracks(inst_name)
+		for track in song_data.tracks:
+			if track.name == inst_name:
+				track.unpack()
+				track.build_schedule()
 	listeners[inst_name].append(listener)
 
 
@@ -112,5 +144,7 @@ func detach_listener(listener: GoiseNoteListener):
 	if inst_name not in listeners:
 		return
 	listeners[inst_name].erase(listener)
+	note_state.erase(listener)
+	live_notes.erase(listener)
 	if not listeners[inst_name]:
 		listeners.erase(inst_name)
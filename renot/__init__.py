@@ -0,0 +1,59 @@
+"""
+renot converts Renoise project files into Goise resources, a Godot plugin.
+
+Songs of a config are converted from the command line with `python -m renot -c config.json`,
+or in memory from Python, which keeps a single process warm across any number of songs:
+
+    import renot
+
+    song_data = renot.convert('song.xrns', {'insts': {'kick': {}, 'snare': {}}})
+    with open('song.tres', 'w') as f:
+        song_data.write_tres(f)
+
+    results = renot.convert_many({'intro': (xrns_bytes, {'insts': {'lead': {}}})})
+
+Submodules are only imported once something of theirs is used.
+"""
+from importlib import import_module
+
+__version__ = '0.4.0'
+
+# The names the package exports, along with the module defining them.
+_exports = {
+    'convert': 'renot',
+    'convert_many': 'renot',
+    'ConversionError': 'renot',
+    'ConversionResult': 'renot',
+    'build_song_data': 'renot',
+    'main': 'renot',
+    'XrnsFile': 'xrns',
+    'EventStore': 'events',
+    'read_events': 'events',
+    'write_events': 'events',
+    'GoiseSongData': 'goise',
+    'GoiseTrack': 'goise',
+    'GoiseNote': 'goise',
+    'GoiseEffect': 'goise',
+    'TempoMap': 'tempo',
+    'load_tres': 'tres',
+    'read_tres': 'tres',
+    'get_song_stats': 'charts',
+    'get_library_stats': 'charts',
+    'SongSimulator': 'simulate',
+    'NoteListener': 'simulate',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name: str):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
@@ -0,0 +1,5 @@
+import sys
+
+from .renot import main
+
+sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+This module turns per-line volume, panning and pitch data of a note into Goise effect automation.
+
+Every note gets its own envelope per parameter, as points of (line, level) relative to the note's beat.
+Envelopes are compacted into as few linear ramps as possible within a tolerance,
+and each ramp becomes a GoiseEffect with params [time, duration, delta], all measured in lines.
+"""
+from .goise import GoiseEffect
+
+
+class Envelope:
+    """
+    The level of a single parameter over the lifetime of a note.
+    Points are linearly interpolated, so a run of per-line values reads as a ramp.
+    """
+
+    def __init__(self, neutral: float, level: float | None = None):
+        self.neutral: float = neutral
+        self.points: list[tuple[float, float]] = [(0.0, neutral if level is None else level)]
+
+    @property
+    def level(self) -> float:
+        return self.points[-1][1]
+
+    def set(self, time: float, level: float):
+        """
+        Moves to a level, ramping over the line before `time`.
+        """
+        last_time, last_level = self.points[-1]
+        if time <= last_time:
+            # Several values on the same line, the last one wins.
+            if len(self.points) > 1 and time == last_time:
+                self.points[-1] = (time, level)
+            elif len(self.points) == 1:
+                self.points[0] = (0.0, level)
+            return
+        if time - 1 > last_time:
+            self.points.append((time - 1, last_level))
+        self.points.append((time, level))
+
+    def slide(self, time: float, amount: float):
+        """
+        Ramps by an amount over the line starting at `time`.
+        """
+        last_time, last_level = self.points[-1]
+        if time > last_time:
+            self.points.append((time, last_level))
+        self.points.append((max(time, last_time) + 1, last_level + amount))
+
+    def compact(self, tolerance: float) -> list[tuple[float, float, float]]:
+        """
+        Fits the envelope with as few ramps as possible,
+        keeping every point within `tolerance` of the result.
+        Returns (time, duration, delta) ramps, where an initial level
+        that isn't neutral is a ramp with no duration.
+        """
+        ramps = []
+        start_time, start_level = self.points[0]
+        if abs(start_level - self.neutral) > tolerance:
+            ramps.append((start_time, 0.0, start_level - self.neutral))
+        else:
+            start_level = self.neutral
+
+        # Swinging door: keep narrowing the slopes a ramp from the anchor may take,
+        # and start a new ramp once no slope fits every point.
+        low, high = float('-inf'), float('inf')
+        end_time, end_slope = start_time, 0.0
+        for time, level in self.points[1:]:
+            span = time - start_time
+            if span <= 0:
+                continue
+            new_low = max(low, (level - tolerance - start_level) / span)
+            new_high = min(high, (level + tolerance - start_level) / span)
+            if new_low <= new_high:
+                low, high = new_low, new_high
+                end_time, end_slope = time, (low + high) / 2 if low > float('-inf') else 0.0
+                continue
+
+            # Close the current ramp and start a new one from where it ended.
+            # A ramp that may as well be flat is left out, and the level stays where it was.
+            if not low <= 0.0 <= high:
+                delta = end_slope * (end_time - start_time)
+                ramps.append((start_time, end_time - start_time, delta))
+                start_level += delta
+            start_time = end_time
+            span = time - start_time
+            low = (level - tolerance - start_level) / span
+            high = (level + tolerance - start_level) / span
+            end_time, end_slope = time, (low + high) / 2
+
+        if end_time > start_time and not low <= 0.0 <= high:
+            ramps.append((start_time, end_time - start_time, end_slope * (end_time - start_time)))
+        return ramps
+
+
+class NoteAutomation:
+    """
+    Collects the volume, panning and pitch of a single note while it plays.
+    Times given to it are lines relative to the note's beat.
+    """
+
+    def __init__(self, volume: float | None = None, panning: float | None = None):
+        self.volume = Envelope(neutral=1.0, level=volume)
+        self.panning = Envelope(neutral=0.0, level=panning)
+        self.pitch = Envelope(neutral=0.0)
+
+    def get_effects(self, tolerance: float) -> list[GoiseEffect]:
+        effects = []
+        for envelope, make in (
+            (self.volume, GoiseEffect.make_volume),
+            (self.panning, GoiseEffect.make_pan),
+            (self.pitch, GoiseEffect.make_pitch),
+        ):
+            for time, duration, delta in envelope.compact(tolerance):
+                effects.append(make(float(time), float(duration), float(delta)))
+        return effects
+
+
+if __name__ == '__main__':
+    # A fade out over 64 lines becomes a single ramp.
+    automation = NoteAutomation(volume=1.0)
+    for line in range(1, 65):
+        automation.volume.set(line, 1.0 - line / 64)
+    automation.pitch.slide(8, 0.5)
+    automation.pitch.slide(9, 0.5)
+    for effect in automation.get_effects(tolerance=0.01):
+        print(effect.type.name, effect.params)
@@ -0,0 +1,5 @@
+"""
+This package benchmarks renot against synthetic Renoise projects.
+
+Run it from the repository root with `python -m renot.bench`.
+"""
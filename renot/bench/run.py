@@ -0,0 +1,167 @@
+"""
+This module times each stage of a renot conversion on synthetic projects,
+and compares the results against a baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ..goise import GoiseSongData
+from ..renot import build_song_data
+from ..xrns import XrnsFile
+from .synth import write_xrns
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+cases: dict[str, dict] = {
+    'small': dict(patterns=8, tracks=4, columns=2, lines=64, repeats=2),
+    'medium': dict(patterns=24, tracks=8, columns=4, lines=64, repeats=4),
+    'large': dict(patterns=32, tracks=12, columns=4, lines=128, repeats=3, line_density=0.6),
+    'effects': dict(patterns=16, tracks=8, columns=2, lines=64, repeats=4, effect_density=0.8),
+}
+
+
+def get_song_config(xrns: XrnsFile) -> tuple[dict, dict]:
+    # Every instrument of the song is exported.
+    data = {
+        'filename': 'synthetic',
+        'insts': {instrument.name: {} for instrument in xrns.instruments},
+    }
+    config = {
+        'global': {'music_path': 'res://music/', 'song_fileformat': '.wav'},
+    }
+    return data, config
+
+
+def measure(func, repeat: int) -> tuple[float, int, object]:
+    """
+    Returns the best time out of `repeat` calls, the peak memory of a separate traced call,
+    and the result of the last call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def run_case(options: dict, repeat: int) -> dict[str, dict[str, float]]:
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, 'synthetic.xrns')
+        write_xrns(filepath, **options)
+
+        # Loading.
+        load_time, load_peak, xrns = measure(lambda: XrnsFile(filepath, stream=True), repeat)
+        pattern_lines = sum(pattern.lines * len(pattern.tracks) for pattern in xrns.patterns)
+        pattern_notes = sum(len(track.step) for pattern in xrns.patterns for track in pattern.tracks)
+
+        # Extraction.
+        data, config = get_song_config(xrns)
+        extract_time, extract_peak, song_data = measure(lambda: build_song_data(xrns, 'synthetic', data, config), repeat)
+        song_data: GoiseSongData
+        song_lines = sum(xrns.patterns[i].lines for i in xrns.pattern_sequence.order) * len(xrns.tracks)
+        song_notes = sum(len(track.notes) for track in song_data.tracks)
+
+        # Serialization.
+        write_time, write_peak, output = measure(song_data.get_tres_string, repeat)
+
+    return {
+        'load': {
+            'seconds': load_time,
+            'peak_bytes': load_peak,
+            'lines_per_second': pattern_lines / load_time,
+            'notes_per_second': pattern_notes / load_time,
+        },
+        'extract': {
+            'seconds': extract_time,
+            'peak_bytes': extract_peak,
+            'lines_per_second': song_lines / extract_time,
+            'notes_per_second': song_notes / extract_time,
+        },
+        'serialize': {
+            'seconds': write_time,
+            'peak_bytes': write_peak,
+            'bytes': len(output),
+            'bytes_per_second': len(output) / write_time,
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists every stage that got slower or bigger than the baseline allows.
+    """
+    regressions = []
+    for case, stages in results.items():
+        for stage, metrics in stages.items():
+            expected = baseline.get(case, {}).get(stage)
+            if not expected:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if metric in expected and metrics[metric] > expected[metric] * (1 + tolerance):
+                    change = metrics[metric] / expected[metric] - 1
+                    regressions.append(f'{case} {stage} {metric}: {expected[metric]:.4g} -> {metrics[metric]:.4g} (+{change:.0%})')
+    return regressions
+
+
+def print_results(results: dict):
+    for case, stages in results.items():
+        print(case)
+        for stage, metrics in stages.items():
+            rates = ', '.join(
+                f'{value:,.0f} {metric.removesuffix("_per_second").replace("_", " ")}/s'
+                for metric, value in metrics.items() if metric.endswith('_per_second')
+            )
+            print(f'  {stage:<10} {metrics["seconds"] * 1000:9.1f} ms {metrics["peak_bytes"] / 1e6:8.2f} MB peak  {rates}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark renot on synthetic Renoise projects')
+    parser.add_argument('cases', nargs='*', default=list(cases), help=f'cases to run, out of {", ".join(cases)}')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='timed runs per stage, the best one is kept')
+    parser.add_argument('-b', '--baseline', default=baseline_path, help='baseline json file to compare against')
+    parser.add_argument('-t', '--tolerance', default=0.25, type=float, help='allowed slowdown before failing, as a fraction')
+    parser.add_argument('-u', '--update-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('-o', '--output', help='also write the results to this json file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case in args.cases:
+        results[case] = run_case(cases[case], args.repeat)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'regression: {regression}', file=sys.stderr)
+    return 1 if regressions else 0
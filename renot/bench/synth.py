@@ -0,0 +1,131 @@
+"""
+This module generates synthetic .xrns project files for benchmarking.
+Only the parts of Song.xml that renot reads are generated.
+"""
+from random import Random
+from zipfile import ZipFile, ZIP_DEFLATED
+
+letters = ['C-', 'C#', 'D-', 'D#', 'E-', 'F-', 'F#', 'G-', 'G#', 'A-', 'A#', 'B-']
+effects = ['0A', '0U', '0D', '0G', '0V', '0L', '0P', 'ZT', 'ZL']
+
+
+def make_song_xml(patterns: int = 16,
+                  tracks: int = 8,
+                  columns: int = 2,
+                  lines: int = 64,
+                  line_density: float = 0.5,
+                  effect_density: float = 0.1,
+                  repeats: int = 4,
+                  instruments: int = 8,
+                  seed: int = 0) -> str:
+    """
+    Creates the contents of a Song.xml.
+
+    `line_density` is the chance of a line holding notes on a track,
+    `effect_density` the chance of a line holding an effect column,
+    and `repeats` how many times each pattern is played on average.
+    """
+    rng = Random(seed)
+    output = ['<?xml version="1.0" encoding="UTF-8"?>', '<RenoiseSong doc_version="63">']
+
+    output.append(
+        '<GlobalSongData>'
+        '<BeatsPerMin>140</BeatsPerMin><LinesPerBeat>4</LinesPerBeat><TicksPerLine>12</TicksPerLine>'
+        '</GlobalSongData>'
+    )
+
+    output.append('<Instruments>')
+    for i in range(instruments):
+        output.append(
+            f'<Instrument><Name>inst_{i}</Name>'
+            f'<GlobalProperties><Transpose>{rng.randint(-12, 12)}</Transpose></GlobalProperties>'
+            f'<SampleEnvelopes><Volume><Nodes><Points><Point>0,1.0</Point></Points></Nodes></Volume></SampleEnvelopes>'
+            f'</Instrument>'
+        )
+    output.append('</Instruments>')
+
+    output.append('<Tracks>')
+    for i in range(tracks):
+        output.append(
+            f'<SequencerTrack type="SequencerTrack"><Name>Track {i:02}</Name>'
+            f'<TrackDelay>{rng.choice([0, 0, 0, 10, -5])}</TrackDelay></SequencerTrack>'
+        )
+    output.append(
+        '<SequencerMasterTrack type="SequencerMasterTrack"><Name>Master</Name>'
+        '<TrackDelay>0</TrackDelay></SequencerMasterTrack>'
+    )
+    output.append('</Tracks>')
+
+    output.append('<PatternPool><Patterns>')
+    for _ in range(patterns):
+        output.append(f'<Pattern><NumberOfLines>{lines}</NumberOfLines><Tracks>')
+        for _ in range(tracks):
+            output.append('<PatternTrack type="PatternTrack"><Lines>')
+            for line in range(lines):
+                has_notes = rng.random() < line_density
+                has_effect = rng.random() < effect_density
+                if not has_notes and not has_effect:
+                    continue
+
+                output.append(f'<Line index="{line}" type="PatternLine">')
+                if has_notes:
+                    output.append('<NoteColumns>')
+                    for _ in range(columns):
+                        output.append(make_note_column(rng, instruments, effect_density))
+                    output.append('</NoteColumns>')
+                if has_effect:
+                    output.append(
+                        f'<EffectColumns><EffectColumn>'
+                        f'<Value>{rng.randrange(0x20, 0x100):02X}</Value><Number>{rng.choice(effects)}</Number>'
+                        f'</EffectColumn></EffectColumns>'
+                    )
+                output.append('</Line>')
+            output.append('</Lines></PatternTrack>')
+        output.append('<PatternMasterTrack type="PatternMasterTrack"><Lines/></PatternMasterTrack>')
+        output.append('</Tracks></Pattern>')
+    output.append('</Patterns></PatternPool>')
+
+    # Every pattern is played at least once, the rest of the sequence reuses them.
+    order = list(range(patterns)) + [rng.randrange(patterns) for _ in range(patterns * (repeats - 1))]
+    output.append('<PatternSequence><SequenceEntries>')
+    for pattern in order:
+        output.append(f'<SequenceEntry><Pattern>{pattern}</Pattern></SequenceEntry>')
+    output.append('</SequenceEntries></PatternSequence>')
+
+    output.append('</RenoiseSong>')
+    return '\n'.join(output)
+
+
+def make_note_column(rng: Random, instruments: int, effect_density: float) -> str:
+    roll = rng.random()
+    if roll < 0.15:
+        return '<NoteColumn/>'
+    if roll < 0.35:
+        return '<NoteColumn><Note>OFF</Note></NoteColumn>'
+    if roll < 0.45:
+        return f'<NoteColumn><Volume>{rng.randrange(0x81):02X}</Volume></NoteColumn>'
+
+    output = (
+        f'<NoteColumn><Note>{rng.choice(letters)}{rng.randint(1, 7)}</Note>'
+        f'<Instrument>{rng.randrange(instruments):02X}</Instrument>'
+        f'<Volume>{rng.randrange(0x81):02X}</Volume>'
+    )
+    if rng.random() < 0.3:
+        output += f'<Panning>{rng.randrange(0x81):02X}</Panning>'
+    if rng.random() < 0.2:
+        output += f'<Delay>{rng.randrange(0x100):02X}</Delay>'
+    if rng.random() < effect_density:
+        output += f'<EffectNumber>0{rng.choice("AUDGV")}</EffectNumber><EffectValue>{rng.randrange(0x100):02X}</EffectValue>'
+    return output + '</NoteColumn>'
+
+
+def write_xrns(filepath: str, **options):
+    """
+    Writes a synthetic .xrns file, taking the same options as `make_song_xml`.
+    """
+    with ZipFile(filepath, 'w', ZIP_DEFLATED) as z:
+        z.writestr('Song.xml', make_song_xml(**options))
+
+
+if __name__ == '__main__':
+    write_xrns('synthetic.xrns')
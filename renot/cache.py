@@ -0,0 +1,89 @@
+"""
+This module keeps track of what each song was last converted from,
+so that songs whose inputs haven't changed can be skipped entirely.
+"""
+import hashlib
+import json
+import os
+
+
+def hash_file(filepath: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_song_key(xrns_filepath: str, data: dict, config: dict, version: str, options: dict | None = None,
+                 file_hash: str | None = None) -> str:
+    """
+    Creates a key for a song out of everything that affects its output:
+    the project file contents, the song's config entry, the global config,
+    the renot version and any output options.
+    `file_hash` is the hash of the project file if it is already known.
+    """
+    digest = hashlib.sha256()
+    digest.update((file_hash or hash_file(xrns_filepath)).encode())
+    digest.update(json.dumps([data, config['global'], version, options or {}], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """
+    A persistent map of song names to the key of the inputs they were last built from.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath: str = filepath
+        self.keys: dict[str, str] = {}
+
+        if os.path.exists(filepath):
+            try:
+                with open(filepath) as f:
+                    self.keys = json.load(f)
+            except (OSError, ValueError):
+                # A broken cache only costs us a rebuild.
+                self.keys = {}
+
+    def get(self, song_key: str) -> str | None:
+        return self.keys.get(song_key)
+
+    def set(self, song_key: str, key: str):
+        self.keys[song_key] = key
+
+    def save(self):
+        with open(self.filepath, 'w') as f:
+            json.dump(self.keys, f, indent=2, sort_keys=True)
+
+
+class FragmentCache:
+    """
+    Keeps the output of each track of a song the last time it was written, one file per song,
+    so that tracks that didn't change can be written out again as they were.
+    """
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+
+    def get_filepath(self, song_key: str) -> str:
+        return os.path.join(self.directory, song_key + '.json')
+
+    def get(self, song_key: str, salt: str = '') -> dict[str, dict]:
+        """
+        Returns the fragments of a song by track file name, or nothing if they were written with another salt.
+        """
+        try:
+            with open(self.get_filepath(song_key)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # A missing or broken cache only costs us a rebuild.
+            return {}
+        if not isinstance(data, dict) or data.get('salt') != salt:
+            return {}
+        return data.get('fragments', {})
+
+    def set(self, song_key: str, fragments: dict[str, dict], salt: str = ''):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.get_filepath(song_key), 'w') as f:
+            json.dump({'salt': salt, 'fragments': fragments}, f)
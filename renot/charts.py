@@ -0,0 +1,208 @@
+"""
+This module measures the charts of exported songs, per track: how dense they are, how many notes
+overlap, the shortest gaps and longest holds, and how many notes GoiseSong looks at per frame.
+Tracks that would strain GoiseSong._process are flagged.
+
+Every measure is taken over sorted typed arrays of note times with binary searches,
+rather than by walking notes against each other, so a track costs O(n log n).
+"""
+import csv
+import json
+import math
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from functools import partial
+from itertools import repeat
+from operator import sub
+from typing import TextIO
+
+from .goise import GoiseSongData, GoiseTrack
+from .schedule import ScheduleIndex, get_effective_end
+from .tempo import TempoMap
+
+# Columns of the report, in order.
+FIELDS = (
+    'song', 'track', 'notes', 'duration', 'notes_per_second', 'peak_notes_per_second',
+    'max_polyphony', 'shortest_gap', 'longest_hold', 'max_window', 'strain',
+)
+
+
+def get_track_stats(track: GoiseTrack, tempo_map: TempoMap, window: float = 1.0, cue: float = -1.0,
+                    max_density: float = 20.0, max_window: int = 64) -> dict:
+    """
+    Measures a single track. Times are in seconds, `window` being the length of the window
+    peak densities are counted over, and `cue` how many lines before its beat a listener cues a note.
+    `strain` lists the reasons the track is flagged, if any.
+    """
+    notes = sorted(track.notes, key=lambda n: n.beat)
+    count = len(notes)
+    get_time = tempo_map.get_time
+
+    beats = array('d', (note.beat for note in notes))
+    ends = array('d', (get_effective_end(note.beat, note.end) for note in notes))
+    times = array('d', map(get_time, beats))
+    end_times = array('d', map(get_time, ends))
+
+    stats = {
+        'song': '',
+        'track': track.name,
+        'notes': count,
+        'duration': 0.0,
+        'notes_per_second': 0.0,
+        'peak_notes_per_second': 0.0,
+        'max_polyphony': 0,
+        'shortest_gap': 0.0,
+        'longest_hold': 0.0,
+        'max_window': 0,
+        'strain': '',
+    }
+    if not count:
+        return stats
+
+    duration = max(end_times) - times[0]
+    stats['duration'] = duration
+    stats['notes_per_second'] = count / duration if duration > 0 else float(count)
+
+    # The most notes starting within any window, which always begins at a note.
+    window_ends = map(partial(bisect_right, times), (t + window for t in times))
+    stats['peak_notes_per_second'] = max(map(sub, window_ends, range(count))) / window
+
+    # The most notes sounding at once, which is reached at a note start. Notes without
+    # a length sound for an instant, and a note ending where another starts doesn't overlap it.
+    sorted_ends = array('d', sorted(
+        end if end > beat else math.nextafter(beat, math.inf) for beat, end in zip(beats, ends)
+    ))
+    started = map(partial(bisect_right, beats), beats)
+    ended = map(partial(bisect_right, sorted_ends), beats)
+    stats['max_polyphony'] = max(map(sub, started, ended))
+
+    # Chords aren't gaps.
+    gaps = [gap for gap in map(sub, times[1:], times) if gap > 0]
+    stats['shortest_gap'] = min(gaps, default=0.0)
+    stats['longest_hold'] = max(map(sub, end_times, times))
+
+    # The most notes GoiseSong looks at in one frame, which is reached just as a note is cued.
+    schedule = ScheduleIndex(beats, ends)
+    stats['max_window'] = max(len(schedule.get_window(beat + cue, cue)) for beat in beats)
+
+    strain = []
+    if stats['peak_notes_per_second'] > max_density:
+        strain.append('density')
+    if stats['max_window'] > max_window:
+        strain.append('window')
+    stats['strain'] = ' '.join(strain)
+    return stats
+
+
+def get_song_stats(song_data: GoiseSongData, song: str = '', **kwargs) -> list[dict]:
+    """
+    Measures every track of a song, see `get_track_stats` for the keyword arguments.
+    """
+    tempo_map = song_data.get_tempo_map()
+    rows = []
+    for track in song_data.tracks:
+        stats = get_track_stats(track, tempo_map, **kwargs)
+        stats['song'] = song
+        rows.append(stats)
+    return rows
+
+
+def load_song_stats(filepath: str, options: dict) -> list[dict]:
+    """
+    Loads and measures an exported song, see `get_track_stats` for the options.
+    """
+    from .tres import load_tres
+
+    song = os.path.splitext(os.path.basename(filepath))[0]
+    return get_song_stats(load_tres(filepath), song, **options)
+
+
+def find_songs(paths: Iterable[str]) -> list[str]:
+    """
+    Returns the .tres files among the given paths, looking inside directories.
+    """
+    filepaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            filepaths.extend(sorted(
+                os.path.join(path, filename) for filename in os.listdir(path) if filename.endswith('.tres')
+            ))
+        else:
+            filepaths.append(path)
+    return filepaths
+
+
+def get_library_stats(filepaths: list[str], options: dict | None = None,
+                      executor: Executor | None = None) -> list[dict]:
+    """
+    Measures every track of every song, on `executor` if given. Rows keep the order of the songs.
+    """
+    mapper = executor.map if executor else map
+    rows = []
+    for song_rows in mapper(load_song_stats, filepaths, repeat(options or {})):
+        rows.extend(song_rows)
+    return rows
+
+
+def write_csv(rows: list[dict], f: TextIO):
+    writer = csv.DictWriter(f, FIELDS, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_json(rows: list[dict], f: TextIO):
+    json.dump(rows, f, indent=2)
+    f.write('\n')
+
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description='Measure the charts of exported songs, per track')
+    parser.add_argument('paths', nargs='*', default=['goise/music/data'], help='.tres files or directories of them')
+    parser.add_argument('-j', '--jobs', dest='jobs', default=0, type=int, help='number of songs to measure in parallel, 0 for one per cpu')
+    parser.add_argument('--format', dest='format', default='csv', choices=['csv', 'json'], help='output format')
+    parser.add_argument('-o', '--output', dest='output', default='-', type=str, help='file to write to, - for stdout')
+    parser.add_argument('--window', dest='window', default=1.0, type=float, help='seconds peak densities are counted over')
+    parser.add_argument('--cue', dest='cue', default=-1.0, type=float, help='lines a note is cued before its beat, negative')
+    parser.add_argument('--max-density', dest='max_density', default=20.0, type=float, help='peak notes per second to flag a track at')
+    parser.add_argument('--max-window', dest='max_window', default=64, type=int, help='notes looked at per frame to flag a track at')
+    args = parser.parse_args(argv)
+
+    filepaths = find_songs(args.paths)
+    options = {'window': args.window, 'cue': args.cue, 'max_density': args.max_density, 'max_window': args.max_window}
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    jobs = min(jobs, len(filepaths)) or 1
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        rows = get_library_stats(filepaths, options, executor)
+    except Exception as e:
+        sys.stderr.write(f'{parser.prog}: {e!r}\n')
+        return 1
+    finally:
+        if executor:
+            executor.shutdown()
+
+    write = write_json if args.format == 'json' else write_csv
+    if args.output == '-':
+        write(rows, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as f:
+            write(rows, f)
+
+    strained = [row for row in rows if row['strain']]
+    for row in strained:
+        sys.stderr.write(f'{parser.prog}: {row["song"]} - {row["track"]} may strain GoiseSong ({row["strain"]})\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
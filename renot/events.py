@@ -0,0 +1,183 @@
+"""
+This module keeps the parsed pattern data of a song in a compact binary file, so that converting
+it again with other instruments or another format, or analyzing it, never reads its XML again.
+
+A file starts with a small json header holding the song properties, instruments, tracks, the
+pattern sequence and where the columns of every pattern track are. The columns follow as the
+typed arrays of Pattern.PatternTrack, back to back. Opening a file maps it into memory and
+hands out memoryviews over it, so nothing is copied or decoded until it is used.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from .xrns import XrnsFile, GlobalSongData, Instrument, Track, Pattern, PatternSequence
+
+MAGIC = b'RNEV'
+FORMAT_VERSION = 1
+
+# Magic, format version and header length, followed by the header and the columns.
+_PREFIX = struct.Struct('<4sII')
+
+# Columns start on multiples of this, so that every one of them can be viewed in place.
+_ALIGNMENT = 8
+
+# The arrays of a pattern track in the order they are stored, along with their type codes.
+_COLUMNS: tuple[tuple[str, str], ...] = tuple(
+    (name, getattr(Pattern.PatternTrack(), name).typecode) for name in Pattern.PatternTrack.__slots__
+)
+
+
+def _pad(length: int) -> int:
+    return -length % _ALIGNMENT
+
+
+def _make(cls, **attributes):
+    # Builds a model object out of its values rather than out of an element.
+    obj = cls.__new__(cls)
+    for name, value in attributes.items():
+        setattr(obj, name, value)
+    return obj
+
+
+def write_events(xrns: XrnsFile, filepath: str, key: str = ''):
+    """
+    Writes the song and pattern data of a loaded project to a file.
+    `key` identifies what the project was loaded from, and is given back by `read_events`.
+    """
+    chunks: list[bytes] = []
+    offset = 0
+    patterns = []
+    for pattern in xrns.patterns:
+        tracks = []
+        for track in pattern.tracks:
+            tracks.append((offset, len(track.line), len(track.fx_line)))
+            for name, _ in _COLUMNS:
+                data = getattr(track, name).tobytes()
+                chunks.append(data)
+                chunks.append(bytes(_pad(len(data))))
+                offset += len(data) + _pad(len(data))
+        patterns.append({'lines': pattern.lines, 'tracks': tracks})
+
+    song = xrns.global_song_data
+    header = json.dumps({
+        'key': key,
+        'byteorder': sys.byteorder,
+        'song': {'bpm': song.bpm, 'lpb': song.lpb, 'tpl': song.tpl},
+        'instruments': [(instrument.name, instrument.transpose) for instrument in xrns.instruments],
+        'tracks': [(track.name, track.type, track.track_delay) for track in xrns.tracks],
+        'sequence': xrns.pattern_sequence.order,
+        'patterns': patterns,
+    }).encode()
+    header += b' ' * _pad(_PREFIX.size + len(header))
+
+    # Readers never see a half written file.
+    temp_filepath = filepath + '.tmp'
+    with open(temp_filepath, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.writelines(chunks)
+    os.replace(temp_filepath, filepath)
+
+
+def read_events(filepath: str) -> tuple[str, XrnsFile]:
+    """
+    Maps a file written by `write_events` into memory.
+    Returns its key along with the project, where every column of every pattern track is a view of the file.
+    The file stays mapped for as long as any of those views are around.
+    """
+    start = time.perf_counter()
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+
+    magic, version, length = _PREFIX.unpack_from(view)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f'{filepath} is not an event store of version {FORMAT_VERSION}')
+    header = json.loads(bytes(view[_PREFIX.size:_PREFIX.size + length]))
+    data = view[_PREFIX.size + length:]
+    swap = header['byteorder'] != sys.byteorder
+
+    def get_column(offset: int, count: int, typecode: str):
+        size = count * array(typecode).itemsize
+        column = data[offset:offset + size].cast(typecode)
+        if swap:
+            # Written on another machine, which costs a copy.
+            column = array(typecode, column)
+            column.byteswap()
+        return column, offset + size + _pad(size)
+
+    patterns = []
+    for pattern in header['patterns']:
+        tracks = []
+        for offset, notes, effects in pattern['tracks']:
+            track = _make(Pattern.PatternTrack)
+            for name, typecode in _COLUMNS:
+                count = effects if name.startswith('fx_') else notes
+                column, offset = get_column(offset, count, typecode)
+                setattr(track, name, column)
+            tracks.append(track)
+        patterns.append(_make(Pattern, lines=pattern['lines'], tracks=tracks))
+
+    xrns = XrnsFile()
+    xrns.global_song_data = _make(GlobalSongData, **header['song'])
+    xrns.instruments = [_make(Instrument, name=name, transpose=transpose) for name, transpose in header['instruments']]
+    xrns.tracks = [
+        _make(Track, name=name, type=track_type, track_delay=track_delay)
+        for name, track_type, track_delay in header['tracks']
+    ]
+    xrns.patterns = patterns
+    xrns.pattern_sequence = _make(PatternSequence, order=header['sequence'])
+    xrns.timings = {'event store load': time.perf_counter() - start}
+    return header['key'], xrns
+
+
+class EventStore:
+    """
+    Keeps the parsed pattern data of every song, one file per song.
+    """
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+
+    def get_filepath(self, song_key: str) -> str:
+        return os.path.join(self.directory, song_key + '.rnev')
+
+    def get(self, song_key: str, key: str) -> XrnsFile | None:
+        """
+        Returns the stored project of a song, or nothing if it was stored from something other than `key`.
+        """
+        try:
+            stored_key, xrns = read_events(self.get_filepath(song_key))
+        except (OSError, ValueError):
+            # A missing or broken store only costs us a parse.
+            return None
+        return xrns if stored_key == key else None
+
+    def set(self, song_key: str, xrns: XrnsFile, key: str):
+        os.makedirs(self.directory, exist_ok=True)
+        write_events(xrns, self.get_filepath(song_key), key)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # a stored project holds the same columns as the parsed one
+    for filepath in sys.argv[1:]:
+        xrns = XrnsFile(filepath, stream=True)
+        with tempfile.TemporaryDirectory() as directory:
+            events_filepath = os.path.join(directory, 'song.rnev')
+            write_events(xrns, events_filepath, 'demo')
+            key, stored = read_events(events_filepath)
+            for pattern, stored_pattern in zip(xrns.patterns, stored.patterns, strict=True):
+                for track, stored_track in zip(pattern.tracks, stored_pattern.tracks, strict=True):
+                    for name, _ in _COLUMNS:
+                        assert list(getattr(track, name)) == list(getattr(stored_track, name)), name
+            size = os.path.getsize(events_filepath)
+            print(f'{filepath}: {len(stored.patterns)} patterns, {size} bytes, loaded in '
+                  f'{stored.timings["event store load"] * 1000:.1f} ms')
+            del stored
@@ -1,26 +1,54 @@
 """
 This module contains a Python version of the Goise resources.
-This allows writing of Goise resources as well (but not reads).
+This allows writing of Goise resources as well, reading them back is done by tres.py.
 """
+import hashlib
 from enum import IntEnum, auto
+from io import StringIO
 from random import Random
+from typing import TextIO
 
-from note import Note
-
-used_ids: set[str] = set()
+from .note import Note
+from .schedule import ScheduleIndex
+from .tempo import TempoMap
 
+class IdAllocator:
+    """
+    Hands out resource IDs that are unique within a single resource file.
+    IDs are derived from a stable key, so identical input always produces identical IDs.
+    """
 
-def get_id_string(length: int = 5, seed: int | None = None) -> str:
-    rng = Random(x=seed)
     chars = 'abcdefghijklmnopqrstuvwxyz0123456789'
-    while True:
-        new_id = ''.join(rng.choice(chars) for _ in range(length))
-        if seed:
-            break
-        if new_id not in used_ids:
-            break
-    used_ids.add(new_id)
-    return new_id
+
+    def __init__(self, seed: str = ''):
+        self.seed: str = seed
+        self.used: set[str] = set()
+
+    def get(self, key: str, length: int = 5) -> str:
+        # Collisions are resolved by rehashing, which is rare enough to stay O(1).
+        attempt = 0
+        while True:
+            digest = hashlib.blake2b(f'{self.seed}/{key}/{attempt}'.encode(), digest_size=16).digest()
+            value = int.from_bytes(digest, 'little')
+            new_id = ''
+            for _ in range(length):
+                value, index = divmod(value, len(self.chars))
+                new_id += self.chars[index]
+            if new_id not in self.used:
+                break
+            attempt += 1
+        self.used.add(new_id)
+        return new_id
+
+    def reserve(self, ids: list[str]):
+        """
+        Marks IDs that are already taken, such as those of reused output.
+        """
+        self.used.update(ids)
+
+
+def get_packed_array_string(array_type: str, values) -> str:
+    return f'{array_type}({", ".join(map(str, values))})'
 
 
 class GoiseSongData:
@@ -33,54 +61,163 @@ class GoiseSongData:
         self.lpb_map: dict[float, float] = lpb_map or {}
         self.tracks: list[GoiseTrack] = []
 
+        # The name and res:// path of every track of a split song, which are stored in files of their own.
+        self.track_paths: list[tuple[str, str]] = []
+
+        self.ids = IdAllocator(seed=song_path)
+        self._uid = self.ids.get('uid', length=13)
+
     """
     Exports
     """
 
-    def get_tres_string(self) -> str:
+    def get_tres_string(self, packed: bool = False, fragments: dict[str, dict] | None = None, salt: str = '') -> str:
         """
         Serializes this entire class into a Godot-friendly format.
         """
-        # I don't think it's harmful to setup output like this??
-        output = \
-        f"""[ext_resource type="Script" path="res://addons/goise/data/track.gd" id="{GoiseTrack.script_id}"]\n""" \
-        f"""[ext_resource type="Script" path="res://addons/goise/data/note.gd" id="{GoiseNote.script_id}"]\n""" \
-        f"""[ext_resource type="Script" path="res://addons/goise/data/song_data.gd" id="{GoiseSongData.script_id}"]\n""" \
-        f"""[ext_resource type="Script" path="res://addons/goise/data/effect.gd" id="{GoiseEffect.script_id}"]\n\n"""
-        load_steps = 5  # external resources + ourselves
+        output = StringIO()
+        self.write_tres(output, packed=packed, fragments=fragments, salt=salt)
+        return output.getvalue()
+
+    def write_tres(self, f: TextIO, packed: bool = False, fragments: dict[str, dict] | None = None, salt: str = ''):
+        """
+        Serializes this entire class into a Godot-friendly format,
+        writing each section straight into a file-like object.
+
+        With `packed` set, each track is written as a single resource of packed arrays
+        instead of one resource per note and effect.
+
+        `fragments` holds the output of each track the last time it was written, by the file name
+        `get_track_filenames` gives it, which unlike the track's name is unique within this song.
+        Tracks whose fingerprint (salted with `salt`) still matches are written out as they were,
+        keeping their IDs, and `fragments` is updated with every track written anew.
+        """
+        # Take over unchanged tracks before anything else claims their IDs.
+        reused = self.reuse_fragments(fragments, packed, salt) if fragments is not None else {}
+
+        # Name every resource before anything references it.
+        self.assign_ids(packed=packed, skip=reused.keys())
+
+        # Create header.
+        f.write(f'[gd_resource type="Resource" script_class="GoiseSongData" load_steps={self.get_load_steps(packed=packed)} format=3 uid="uid://{self._uid}"]\n\n')
+
+        # Create external resources.
+        f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/track.gd" id="{GoiseTrack.script_id}"]\n""")
+        if not packed:
+            f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/note.gd" id="{GoiseNote.script_id}"]\n""")
+        f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/song_data.gd" id="{GoiseSongData.script_id}"]\n""")
+        if not packed:
+            f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/effect.gd" id="{GoiseEffect.script_id}"]\n""")
+        f.write('\n')
 
         # Establish subresources depth-first.
-        for track in self.tracks:
-            new_steps, output_text = track.get_tres_string()
-            load_steps += new_steps
-            output += output_text
+        for track, filename in zip(self.tracks, self.get_track_filenames()):
+            if filename in reused:
+                f.write(reused[filename]['text'])
+            elif fragments is not None:
+                fragments[filename] = track.get_fragment(packed, salt)
+                f.write(fragments[filename]['text'])
+            elif packed:
+                track.write_tres_packed(f)
+            else:
+                track.write_tres(f)
 
         # Create last resource reference.
+        self.write_tres_resource(f)
+
+    def write_tres_manifest(self, f: TextIO):
+        """
+        Writes this song without its tracks, only listing the path of each one in `track_paths`.
+        The tracks are written on their own by GoiseTrack.write_tres_file, so that Goise only loads
+        the tracks someone listens to.
+        """
+        f.write(f'[gd_resource type="Resource" script_class="GoiseSongData" load_steps=3 format=3 uid="uid://{self._uid}"]\n\n')
+        f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/track.gd" id="{GoiseTrack.script_id}"]\n""")
+        f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/song_data.gd" id="{GoiseSongData.script_id}"]\n\n""")
+        self.write_tres_resource(f, tracks=False)
+
+    def write_tres_resource(self, f: TextIO, tracks: bool = True):
+        """
+        Writes our own resource, referencing our tracks as subresources if `tracks` is set,
+        or listing `track_paths` otherwise.
+        """
         bpm_str = ',\n'.join(f'{key}: {val}' for key, val in self.bpm_map.items())
         lbp_str = ',\n'.join(f'{key}: {val}' for key, val in self.lpb_map.items())
-        last_ref = \
-        f"""[resource]\n""" \
-        f"""script = ExtResource("{GoiseSongData.script_id}")\n""" \
-        f"""song_path = "{self.song_path}"\n""" \
-        """bpm_map = {\n""" \
-        f"""{bpm_str}\n""" \
-        """}\n""" \
-        """lpb_map = {\n""" \
-        f"""{lbp_str}\n""" \
-        """}\n""" \
-        f"""tracks = Array[ExtResource("{GoiseTrack.script_id}")]([{', '.join([
-            f'SubResource("{track.get_unique_id()}")'
-            for track in self.tracks
-        ])}])\n"""
-        output += last_ref
-
-        # Create header.
-        uid = get_id_string(length=13, seed=hash(self.song_path))
-        header = f'[gd_resource type="Resource" script_class="GoiseSongData" load_steps={load_steps} format=3 uid="uid://{uid}"]\n\n'
-        output = header + output
+        tempo_map = self.get_tempo_map()
+        f.write(
+            f"""[resource]\n"""
+            f"""script = ExtResource("{GoiseSongData.script_id}")\n"""
+            f"""song_path = "{self.song_path}"\n"""
+            """bpm_map = {\n"""
+            f"""{bpm_str}\n"""
+            """}\n"""
+            """lpb_map = {\n"""
+            f"""{lbp_str}\n"""
+            """}\n"""
+            f"""tempo_lines = PackedFloat64Array({', '.join(str(float(line)) for line in tempo_map.lines)})\n"""
+            f"""tempo_times = PackedFloat64Array({', '.join(str(time) for time in tempo_map.times)})\n"""
+            f"""tempo_rates = PackedFloat64Array({', '.join(str(float(rate)) for rate in tempo_map.rates)})\n"""
+            f"""tracks = Array[ExtResource("{GoiseTrack.script_id}")]([{', '.join([
+                f'SubResource("{track.get_unique_id()}")'
+                for track in self.tracks
+            ] if tracks else [])}])\n"""
+        )
+        if not tracks:
+            f.write(
+                f"""track_names = PackedStringArray({', '.join(f'"{name}"' for name, _ in self.track_paths)})\n"""
+                f"""track_paths = PackedStringArray({', '.join(f'"{path}"' for _, path in self.track_paths)})\n"""
+            )
+
+    def get_load_steps(self, packed: bool = False) -> int:
+        if packed:
+            # external resources + ourselves + one resource per track
+            return 3 + len(self.tracks)
+
+        # external resources + ourselves
+        return 5 + sum(track.get_load_steps() for track in self.tracks)
+
+    def get_tempo_map(self) -> TempoMap:
+        return TempoMap(self.bpm_map, self.lpb_map)
+
+    def get_track_filenames(self) -> list[str]:
+        """
+        Returns a file name for each track made from its name, unique within this song.
+        """
+        filenames = []
+        used = set()
+        for track in self.tracks:
+            base = ''.join(char if char.isalnum() or char in '-_' else '_' for char in track.name) or 'track'
+            filename = base
+            count = 1
+            while filename.lower() in used:
+                count += 1
+                filename = f'{base}_{count}'
+            used.add(filename.lower())
+            filenames.append(filename + '.tres')
+        return filenames
+
+    def assign_ids(self, packed: bool = False, skip=()):
+        """
+        Gives every resource of this song that doesn't have an ID yet a stable one.
+        Packed songs only have track resources. Tracks whose file name is in `skip` are left alone.
+        """
+        for track, filename in zip(self.tracks, self.get_track_filenames()):
+            if filename not in skip:
+                track.assign_ids(self.ids, notes=not packed)
 
-        # We are done.
-        return output
+    def reuse_fragments(self, fragments: dict[str, dict], packed: bool = False, salt: str = '') -> dict[str, dict]:
+        """
+        Returns the fragments of the tracks that haven't changed since they were written,
+        by file name, and gives those tracks their previous IDs back.
+        """
+        reused = {}
+        for track, filename in zip(self.tracks, self.get_track_filenames()):
+            fragment = fragments.get(filename)
+            if fragment and fragment['fingerprint'] == track.get_fingerprint(packed, salt):
+                reused[filename] = fragment
+                track._id = fragment['id']
+                self.ids.reserve(fragment['ids'])
+        return reused
 
     """
     Interface
@@ -98,42 +235,168 @@ class GoiseTrack:
         self.name: str = name
         self.notes: list[GoiseNote] = []
 
-        self._id = get_id_string()
+        self._id: str | None = None
 
     """
     Export
     """
 
     def get_tres_string(self) -> tuple[int, str]:
-        # Create subresource references.
-        output = ""
-        load_steps = 1
+        self.assign_ids(IdAllocator())
+        output = StringIO()
+        self.write_tres(output)
+        return self.get_load_steps(), output.getvalue()
 
+    def write_tres_file(self, f: TextIO, packed: bool = False, seed: str = ''):
+        """
+        Writes this track as a resource file of its own, as listed by a song manifest.
+        IDs are assigned here, derived from `seed`, which should be unique to the file.
+        """
+        ids = IdAllocator(seed=seed)
+        uid = ids.get('uid', length=13)
+        self.assign_ids(ids, notes=not packed)
+
+        # external resources + ourselves, and our notes and effects
+        load_steps = 2 if packed else 3 + self.get_load_steps()
+        f.write(f'[gd_resource type="Resource" script_class="GoiseTrack" load_steps={load_steps} format=3 uid="uid://{uid}"]\n\n')
+        f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/track.gd" id="{self.script_id}"]\n""")
+        if not packed:
+            f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/note.gd" id="{GoiseNote.script_id}"]\n""")
+            f.write(f"""[ext_resource type="Script" path="res://addons/goise/data/effect.gd" id="{GoiseEffect.script_id}"]\n""")
+        f.write('\n')
+
+        if packed:
+            self.write_tres_packed(f, resource=True)
+        else:
+            self.write_tres(f, resource=True)
+
+    def write_tres(self, f: TextIO, resource: bool = False):
         # Establish subresources depth-first.
         for note in self.notes:
-            new_steps, output_text = note.get_tres_string()
-            load_steps += new_steps
-            output += output_text
+            note.write_tres(f)
+
+        # Sort notes.
+        self.notes = sorted(self.notes, key=lambda n: n.beat)
+        schedule = self.get_schedule()
 
+        # Create our own resource reference.
+        f.write(
+            f"""{self.get_heading(resource)}\n"""
+            f"""script = ExtResource("{self.script_id}")\n"""
+            f"""name = "{self.name}"\n"""
+            f"""notes = Array[ExtResource("{GoiseNote.script_id}")]([{', '.join([
+                f'SubResource("{note.get_unique_id()}")'
+                for note in self.notes
+            ])}])\n"""
+            f"""schedule_beats = {get_packed_array_string('PackedFloat64Array', schedule.beats)}\n"""
+            f"""schedule_ends = {get_packed_array_string('PackedFloat64Array', schedule.ends)}\n\n"""
+        )
+
+    def write_tres_packed(self, f: TextIO, resource: bool = False):
+        """
+        Writes this track as a single resource, with each note field in its own packed array.
+        The effects of note i are effects effect_offsets[i] to effect_offsets[i + 1],
+        and the params of effect j are params effect_param_offsets[j] to effect_param_offsets[j + 1].
+        The schedule beats are the packed beats, so only the schedule ends are written.
+        """
         # Sort notes.
         self.notes = sorted(self.notes, key=lambda n: n.beat)
+        schedule = self.get_schedule()
+
+        # Flatten effects.
+        effect_offsets = [0]
+        effect_types = []
+        effect_param_offsets = [0]
+        effect_params = []
+        for note in self.notes:
+            for fx in note.effects:
+                effect_types.append(int(fx.type) - 1)
+                effect_params.extend(float(param) for param in fx.params)
+                effect_param_offsets.append(len(effect_params))
+            effect_offsets.append(len(effect_types))
 
         # Create our own resource reference.
-        output += \
-        f"""[sub_resource type="Resource" id="{self.get_unique_id()}"]\n""" \
-        f"""script = ExtResource("{self.script_id}")\n""" \
-        f"""name = "{self.name}"\n""" \
-        f"""notes = Array[ExtResource("{GoiseNote.script_id}")]([{', '.join([
-            f'SubResource("{note.get_unique_id()}")'
+        f.write(
+            f"""{self.get_heading(resource)}\n"""
+            f"""script = ExtResource("{self.script_id}")\n"""
+            f"""name = "{self.name}"\n"""
+            f"""packed_notes = {get_packed_array_string('PackedInt32Array', (note.note.step for note in self.notes))}\n"""
+            f"""packed_beats = {get_packed_array_string('PackedFloat64Array', (note.beat for note in self.notes))}\n"""
+            f"""packed_ends = {get_packed_array_string('PackedFloat64Array', (note.end for note in self.notes))}\n"""
+            f"""packed_times = {get_packed_array_string('PackedFloat64Array', (note.time for note in self.notes))}\n"""
+            f"""packed_end_times = {get_packed_array_string('PackedFloat64Array', (note.end_time for note in self.notes))}\n"""
+            f"""packed_effect_offsets = {get_packed_array_string('PackedInt32Array', effect_offsets)}\n"""
+            f"""packed_effect_types = {get_packed_array_string('PackedInt32Array', effect_types)}\n"""
+            f"""packed_effect_param_offsets = {get_packed_array_string('PackedInt32Array', effect_param_offsets)}\n"""
+            f"""packed_effect_params = {get_packed_array_string('PackedFloat64Array', effect_params)}\n"""
+            f"""schedule_ends = {get_packed_array_string('PackedFloat64Array', schedule.ends)}\n\n"""
+        )
+
+    def get_load_steps(self) -> int:
+        return 1 + sum(note.get_load_steps() for note in self.notes)
+
+    def get_fingerprint(self, packed: bool = False, salt: str = '') -> str:
+        """
+        Hashes everything our output is made from, so that unchanged tracks can be told apart.
+        """
+        digest = hashlib.blake2b(f'{salt}/{packed}/{self.name}'.encode(), digest_size=16)
+        digest.update(repr([
+            (note.note.step, note.beat, note.end, note.time, note.end_time,
+             [(int(fx.type), fx.params) for fx in note.effects])
             for note in self.notes
-        ])}])\n\n"""
+        ]).encode())
+        return digest.hexdigest()
 
-        # Return.
-        return load_steps, output
+    def get_fragment(self, packed: bool = False, salt: str = '') -> dict:
+        """
+        Writes this track, returning its text along with what is needed to reuse it later.
+        IDs have to be assigned first.
+        """
+        # Writing sorts our notes, so the fingerprint has to come first to match later ones.
+        fingerprint = self.get_fingerprint(packed, salt)
+        output = StringIO()
+        if packed:
+            self.write_tres_packed(output)
+        else:
+            self.write_tres(output)
+        return {
+            'fingerprint': fingerprint,
+            'id': self._id,
+            'ids': self.get_ids(notes=not packed),
+            'text': output.getvalue(),
+        }
+
+    def get_ids(self, notes: bool = True) -> list[str]:
+        ids = [self._id]
+        if notes:
+            for note in self.notes:
+                ids.append(note._id)
+                ids.extend(fx._id for fx in note.effects)
+        return ids
+
+    def get_schedule(self) -> ScheduleIndex:
+        """
+        Returns the scheduling index of our notes, which have to be sorted by beat.
+        """
+        return ScheduleIndex.from_notes(self.notes)
+
+    def assign_ids(self, ids: IdAllocator, notes: bool = True):
+        key = f'track/{self.name}'
+        if self._id is None:
+            self._id = ids.get(key)
+        if notes:
+            for note in self.notes:
+                note.assign_ids(ids, key)
 
     def get_unique_id(self) -> str:
         return f'Resource_{self._id}'
 
+    def get_heading(self, resource: bool = False) -> str:
+        # The main resource of a file of its own, or a subresource of a song.
+        if resource:
+            return '[resource]'
+        return f'[sub_resource type="Resource" id="{self.get_unique_id()}"]'
+
     """
     Interface
     """
@@ -149,43 +412,57 @@ class GoiseNote:
     def __init__(self,
                  note: Note,
                  beat: float,
-                 end: float):
+                 end: float,
+                 time: float = 0.0,
+                 end_time: float = 0.0):
         self.note: Note = note
         self.beat: float = beat
         self.end: float = end
+        self.time: float = time
+        self.end_time: float = end_time
         self.effects: list[GoiseEffect] = []
 
-        self._id = get_id_string()
+        self._id: str | None = None
 
     """
     Export
     """
 
     def get_tres_string(self) -> tuple[int, str]:
-        # Create subresource references.
-        output = ""
-        load_steps = 1
+        self.assign_ids(IdAllocator())
+        output = StringIO()
+        self.write_tres(output)
+        return self.get_load_steps(), output.getvalue()
 
+    def write_tres(self, f: TextIO):
         # Establish subresources depth-first.
         for fx in self.effects:
-            new_steps, output_text = fx.get_tres_string()
-            load_steps += new_steps
-            output += output_text
+            fx.write_tres(f)
 
         # Create our own resource reference.
-        output += \
-        f"""[sub_resource type="Resource" id="{self.get_unique_id()}"]\n""" \
-        f"""script = ExtResource("{self.script_id}")\n""" \
-        f"""note = {self.note.step}\n""" \
-        f"""beat = {self.beat}\n""" \
-        f"""end = {self.end}\n""" \
-        f"""effects = Array[ExtResource("{GoiseEffect.script_id}")]([{', '.join([
-            f'SubResource("{fx.get_unique_id()}")'
-            for fx in self.effects
-        ])}])\n\n"""
-
-        # Return.
-        return load_steps, output
+        f.write(
+            f"""[sub_resource type="Resource" id="{self.get_unique_id()}"]\n"""
+            f"""script = ExtResource("{self.script_id}")\n"""
+            f"""note = {self.note.step}\n"""
+            f"""beat = {self.beat}\n"""
+            f"""end = {self.end}\n"""
+            f"""time = {self.time}\n"""
+            f"""end_time = {self.end_time}\n"""
+            f"""effects = Array[ExtResource("{GoiseEffect.script_id}")]([{', '.join([
+                f'SubResource("{fx.get_unique_id()}")'
+                for fx in self.effects
+            ])}])\n\n"""
+        )
+
+    def get_load_steps(self) -> int:
+        return 1 + len(self.effects)
+
+    def assign_ids(self, ids: IdAllocator, prefix: str = ''):
+        key = f'{prefix}/{self.note.step}/{self.beat}'
+        if self._id is None:
+            self._id = ids.get(key)
+        for i, fx in enumerate(self.effects):
+            fx.assign_ids(ids, f'{key}/{i}')
 
     def get_unique_id(self) -> str:
         return f'Resource_{self._id}'
@@ -212,28 +489,35 @@ class GoiseEffect:
         self.type: GoiseEffect.Type = GoiseEffect.Type.NONE
         self.params: list[float] = []
 
-        self._id = get_id_string()
+        self._id: str | None = None
 
     """
     Export
     """
 
     def get_tres_string(self) -> tuple[int, str]:
-        # Create subresource references.
-        output = ""
-        load_steps = 1
+        self.assign_ids(IdAllocator())
+        output = StringIO()
+        self.write_tres(output)
+        return self.get_load_steps(), output.getvalue()
 
+    def write_tres(self, f: TextIO):
         # Create our own resource reference.
-        output += \
-        f"""[sub_resource type="Resource" id="{self.get_unique_id()}"]\n""" \
-        f"""script = ExtResource("{self.script_id}")\n""" \
-        f"""type = {int(self.type) - 1}\n""" \
-        f"""params = Array[float]([{', '.join([
-            str(param) for param in self.params
-        ])}])\n\n"""
-
-        # Return.
-        return load_steps, output
+        f.write(
+            f"""[sub_resource type="Resource" id="{self.get_unique_id()}"]\n"""
+            f"""script = ExtResource("{self.script_id}")\n"""
+            f"""type = {int(self.type) - 1}\n"""
+            f"""params = Array[float]([{', '.join([
+                str(param) for param in self.params
+            ])}])\n\n"""
+        )
+
+    def get_load_steps(self) -> int:
+        return 1
+
+    def assign_ids(self, ids: IdAllocator, key: str = 'effect'):
+        if self._id is None:
+            self._id = ids.get(key)
 
     def get_unique_id(self) -> str:
         return f'Resource_{self._id}'
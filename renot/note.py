@@ -1,10 +1,16 @@
 class Note:
 
+    __slots__ = ('step',)
+
     letters = [
         'C', 'C#', 'D', 'D#', 'E', 'F',
         'F#', 'G', 'G#', 'A', 'A#', 'B',
     ]
 
+    # Every note name of octaves 0 to 9 with its step, filled in below the class.
+    # Names are accepted both as 'C4' and with Renoise's padding as 'C-4'.
+    names: dict[str, int] = {}
+
     def __init__(self, step: int):
         self.step = step
 
@@ -13,6 +19,10 @@ class Note:
 
     @classmethod
     def from_string(cls, note: str) -> 'Note':
+        step = cls.names.get(note)
+        if step is not None:
+            return cls(step=step)
+
         note = note.replace('-', '')
         octave = int(note[-1])
         note = note[:-1]
@@ -25,3 +35,11 @@ class Note:
         letter = self.letters[letter_index]
         octave = self.step // len(self.letters)
         return letter + str(octave)
+
+
+for _octave in range(10):
+    for _index, _letter in enumerate(Note.letters):
+        _step = _octave * len(Note.letters) + _index
+        Note.names[f'{_letter}{_octave}'] = _step
+        Note.names[f'{_letter:-<2}{_octave}'] = _step
+del _octave, _index, _letter, _step
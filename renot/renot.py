@@ -4,38 +4,719 @@ This module is the main file for running renot.
 import json
 import sys
 import os
+import io
 import argparse
-import logging
-from pathlib import Path
+import time
+from concurrent.futures import Executor
+from itertools import repeat
+from typing import BinaryIO
 
-from note import Note
-from goise import GoiseSongData, GoiseTrack, GoiseNote
-from xrns import XrnsFile, Pattern
+from . import __version__
+from .automation import NoteAutomation
+from .cache import BuildCache, FragmentCache, get_song_key, hash_file
+from .events import EventStore
+from .note import Note
+from .stats import Stats, SongStats
+from .goise import GoiseSongData, GoiseTrack, GoiseNote
+from .tempo import TempoMap
+from .xrns import XrnsFile, Pattern, NOTE_OFF, NOTE_EMPTY, VALUE_EMPTY, encode_effect_number
 
 __date__ = '2023-10-24'
 __updated__ = '2023-10-24'
 __author__ = 'micahanichols27@gmail.com'
 
 
-def main(argv=None):
+def write_message(file, name: str, text: str, with_name: bool = True):
+    if with_name:
+        file.write(name + f": {text}\n")
+    else:
+        indent = len(name) * " "
+        file.write(indent + f"  {text}\n")
+
+
+# Effect numbers of the commands that change the song speed.
+BPM_EFFECT = encode_effect_number('ZT')
+LPB_EFFECT = encode_effect_number('ZL')
+
+# Effect numbers of pitch slides, in 1/16ths of a semitone per tick.
+SLIDE_UP_EFFECT = encode_effect_number('0U')
+SLIDE_DOWN_EFFECT = encode_effect_number('0D')
+
+# Instrument indices of pattern events that don't start a note.
+EVENT_OFF = -1
+EVENT_AUTOMATION = -2
+EVENT_CUT = -3
+
+
+def get_pattern_tempo_changes(pattern: Pattern) -> list[tuple[int, int, int]]:
+    """
+    Finds every bpm and lpb command of a pattern, on any track or column.
+    Returns (line, effect number, value) tuples in line order,
+    where later tracks win over earlier ones on the same line.
+    """
+    changes = []
+    for track in pattern.tracks:
+        columns = (
+            zip(track.fx_line, track.fx_number, track.fx_value),
+            zip(track.line, track.effect_number, track.effect_value),
+        )
+        for column in columns:
+            for line_index, number, value in column:
+                if number in (BPM_EFFECT, LPB_EFFECT) and value > 0:
+                    changes.append((line_index, number, value))
+    changes.sort(key=lambda change: change[0])
+    return changes
+
+
+def get_tempo_map(xrns: XrnsFile) -> TempoMap:
+    """
+    Builds the tempo map of a song by walking its pattern sequence.
+    """
+    tempo_map = TempoMap(
+        bpm_map={0: xrns.global_song_data.bpm},
+        lpb_map={0: xrns.global_song_data.lpb},
+    )
+    pattern_changes: dict[int, list[tuple[int, int, int]]] = {}
+    global_line_index = 0
+    for pattern_index in xrns.pattern_sequence.order:
+        pattern: Pattern = xrns.patterns[pattern_index]
+        changes = pattern_changes.get(pattern_index)
+        if changes is None:
+            changes = get_pattern_tempo_changes(pattern)
+            pattern_changes[pattern_index] = changes
+
+        for local_line_index, number, value in changes:
+            if number == BPM_EFFECT:
+                tempo_map.set_bpm(global_line_index + local_line_index, value)
+            else:
+                tempo_map.set_lpb(global_line_index + local_line_index, value)
+
+        global_line_index += pattern.lines
+    return tempo_map
+
+
+def get_pattern_events(track: Pattern.PatternTrack,
+                       index_to_track: dict[int, tuple[GoiseTrack, int]],
+                       automation: bool = False) -> list[tuple]:
+    """
+    Decodes the note events of a pattern track that matter for the exported instruments.
+    Returns (line, delay time, column, instrument index, transposed step, volume, panning, slide)
+    tuples relative to the pattern, where the instrument index is one of the EVENT_ values
+    for events that don't start a note. Slides are signed 0U/0D amounts.
+
+    With `automation` set, columns that only change the volume, panning or pitch of a playing note
+    are included as well, and effect column slides use a column of -1 for the whole track.
+    """
+    events = []
+    columns = zip(
+        track.line, track.column, track.step, track.instrument, track.delay,
+        track.volume, track.panning, track.effect_number, track.effect_value,
+    )
+    for line_index, column, step, instrument_index, delay, volume, panning, number, value in columns:
+        if step == NOTE_OFF:
+            events.append((line_index, delay / 256, column, EVENT_OFF, step, VALUE_EMPTY, VALUE_EMPTY, 0))
+        elif step != NOTE_EMPTY and instrument_index in index_to_track:
+            _, transpose = index_to_track[instrument_index]
+            slide = get_slide(number, value) if automation else 0
+            events.append((line_index, delay / 256, column, instrument_index, step + transpose, volume, panning, slide))
+        elif automation and instrument_index < 0:
+            slide = get_slide(number, value)
+            if volume != VALUE_EMPTY or panning != VALUE_EMPTY or slide:
+                events.append((line_index, delay / 256, column, EVENT_AUTOMATION, step, volume, panning, slide))
+        elif automation:
+            # another instrument takes over this column
+            events.append((line_index, delay / 256, column, EVENT_CUT, step, VALUE_EMPTY, VALUE_EMPTY, 0))
+
+    if automation:
+        for line_index, number, value in zip(track.fx_line, track.fx_number, track.fx_value):
+            if slide := get_slide(number, value):
+                events.append((line_index, 0.0, -1, EVENT_AUTOMATION, NOTE_EMPTY, VALUE_EMPTY, VALUE_EMPTY, slide))
+        events.sort(key=lambda event: event[0])
+    return events
+
+
+def get_slide(number: int, value: int) -> int:
+    if number == SLIDE_UP_EFFECT:
+        return value
+    if number == SLIDE_DOWN_EFFECT:
+        return -value
+    return 0
+
+
+def build_song_data(xrns: XrnsFile, song_key: str, data: dict, config: dict, p=None,
+                    options: dict | None = None) -> GoiseSongData:
+    """
+    Extracts the notes of every instrument in a song's config entry out of a loaded project.
+    With the `effects` option set, volume, panning and pitch automation is added to each note,
+    compacted within the `effect_tolerance` option.
+    """
+    p = p or (lambda text, with_name=True: None)
+    options = options or {}
+    automation = options.get('effects', False)
+    tolerance = options.get('effect_tolerance', 0.01)
+    slide_scale = xrns.global_song_data.tpl / 16  # semitones per line per slide step
+
+    # useful constants
+    pattern_order: list[int] = xrns.pattern_sequence.order
+
+    # determine the bpm and lpb maps
+    tempo_map = get_tempo_map(xrns)
+
+    # start creating our output file
+    song_data = GoiseSongData(
+        song_path=config['global']['music_path'] + data['filename'] + config['global']['song_fileformat'],
+        bpm_map=tempo_map.bpm_map,
+        lpb_map=tempo_map.lpb_map,
+    )
+
+    # find the index of each instrument we export, keeping the first match by name
+    instrument_indices: dict[str, int] = {}
+    for i, xrns_instrument in enumerate(xrns.instruments):
+        instrument_indices.setdefault(xrns_instrument.name, i)
+
+    # create a track for each instrument name, keyed by instrument index
+    index_to_track: dict[int, tuple[GoiseTrack, int]] = {}
+    for inst_name, inst_data in data['insts'].items():
+        instrument_index = instrument_indices.get(inst_name)
+        if instrument_index is None:
+            p(f'{song_key} - could not find {inst_name} in {data["filename"]}')
+            continue
+
+        # create our instrument type
+        p(f'{song_key} - building instrument {inst_name}')
+        instrument = GoiseTrack(name=inst_data.get('name', inst_name))
+        song_data.add_track(instrument)
+        index_to_track[instrument_index] = (instrument, xrns.instruments[instrument_index].transpose)
+
+    # sweep over the song once, handing each note to the track of its instrument
+    current_notes: dict[int, tuple[GoiseNote, float]] = {}
+    automations: list[tuple[GoiseNote, NoteAutomation]] = []
+    for track_index in range(len(xrns.tracks)):
+        global_line_index = 0
+        track_delay = xrns.tracks[track_index].track_delay / 1000
+
+        # the note playing in each column of this track, for automation
+        column_notes: dict[int, tuple[GoiseNote, NoteAutomation]] = {}
+
+        # patterns repeat a lot, so each one is only decoded once per track
+        pattern_events: dict[int, list[tuple]] = {}
+
+        for pattern_index in pattern_order:
+            # ok cool! we are looking at this pattern now
+            pattern: Pattern = xrns.patterns[pattern_index]
+            events = pattern_events.get(pattern_index)
+            if events is None:
+                events = get_pattern_events(pattern.tracks[track_index], index_to_track, automation)
+                pattern_events[pattern_index] = events
+
+            for local_line_index, delay_time, column, instrument_index, step, volume, panning, slide in events:
+                line_index = global_line_index + local_line_index
+                if instrument_index == EVENT_OFF:
+                    # we cancel every current note
+                    end = line_index + delay_time
+                    for current_note, note_delay in current_notes.values():
+                        current_note.end = end
+                        current_note.end_time = tempo_map.get_time(end) + note_delay
+                    current_notes.clear()
+                    column_notes.clear()
+                elif instrument_index == EVENT_AUTOMATION:
+                    # we change how the playing notes sound
+                    targets = column_notes.values() if column < 0 else [column_notes.get(column)]
+                    for target in targets:
+                        if target is None:
+                            continue
+                        current_note, note_automation = target
+                        time = line_index + delay_time - current_note.beat
+                        if volume <= 0x80:
+                            note_automation.volume.set(time, volume / 0x80)
+                        if panning <= 0x80:
+                            note_automation.panning.set(time, (panning - 0x40) / 0x40)
+                        if slide:
+                            note_automation.pitch.slide(time, slide * slide_scale)
+                elif instrument_index == EVENT_CUT:
+                    # another instrument took over this column
+                    column_notes.pop(column, None)
+                else:
+                    # we start using this instrument
+                    instrument, _ = index_to_track[instrument_index]
+                    beat = line_index + delay_time
+                    current_note = GoiseNote(
+                        note=Note(step),
+                        beat=beat,
+                        end=0.0,
+                        time=tempo_map.get_time(beat) + track_delay,
+                    )
+                    instrument.add_note(current_note)
+                    current_notes[instrument_index] = (current_note, track_delay)
+
+                    if automation:
+                        note_automation = NoteAutomation(
+                            volume=volume / 0x80 if volume <= 0x80 else None,
+                            panning=(panning - 0x40) / 0x40 if panning <= 0x80 else None,
+                        )
+                        if slide:
+                            note_automation.pitch.slide(0.0, slide * slide_scale)
+                        column_notes[column] = (current_note, note_automation)
+                        automations.append((current_note, note_automation))
+
+            # increase time by lines iterated over
+            global_line_index += pattern.lines
+
+    # compact the automation of every note into effects
+    for current_note, note_automation in automations:
+        for effect in note_automation.get_effects(tolerance):
+            current_note.add_effect(effect)
+
+    return song_data
+
+
+# Where split songs are found by Goise, unless the `data_path` global config says otherwise.
+DEFAULT_DATA_PATH = 'res://music/data/'
+
+# Global config used by `convert` for whatever a given config leaves out.
+DEFAULT_GLOBAL_CONFIG = {
+    'music_path': 'res://music/',
+    'song_fileformat': '.wav',
+}
+
+
+class ConversionError(Exception):
+    """
+    Raised by `convert` when a song can't be converted.
+    The error that stopped the conversion is kept as `error`, and as its `__cause__`.
+    """
+
+    def __init__(self, song_key: str, error: Exception):
+        super().__init__(f'{song_key}: {error!r}')
+        self.song_key: str = song_key
+        self.error: Exception = error
+
+
+class ConversionResult:
+    """
+    The outcome of converting a single song with `convert_many`:
+    its song data if it succeeded, or the error it failed with, along with everything it logged.
+    """
+
+    def __init__(self, song_key: str, song_data: GoiseSongData | None = None,
+                 error: Exception | None = None, log: str = ''):
+        self.song_key: str = song_key
+        self.song_data: GoiseSongData | None = song_data
+        self.error: Exception | None = error
+        self.log: str = log
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f'ConversionResult({self.song_key}, {"ok" if self.ok else repr(self.error)})'
+
+
+def convert(xrns: str | bytes | BinaryIO, song_config: dict, song_key: str = 'song',
+            config: dict | None = None, options: dict | None = None, p=None, pattern_jobs: int = 1) -> GoiseSongData:
+    """
+    Converts a single song in memory, without touching the cache or writing anything.
+
+    `xrns` is the path of a project file, its bytes, or a binary file object. `song_config` is
+    the song's entry of a config, where `filename` defaults to `song_key`. `config` may hold
+    the `global` entry of a config, and `options` the output options given on the command line.
+    With `pattern_jobs` above one, the patterns of a large project are parsed in that many processes.
+    Raises ConversionError if the song can't be converted.
+    """
+    data = {'filename': song_key, **song_config}
+    config = {'global': {**DEFAULT_GLOBAL_CONFIG, **(config or {}).get('global', {})}}
+    try:
+        xrns = XrnsFile(xrns, stream=True, instruments=data['insts'].keys(), pattern_jobs=pattern_jobs)
+        return build_song_data(xrns, song_key, data, config, p, options)
+    except Exception as e:
+        raise ConversionError(song_key, e) from e
+
+
+def convert_result(song_key: str, xrns: str | bytes | BinaryIO, song_config: dict,
+                   config: dict | None = None, options: dict | None = None, pattern_jobs: int = 1) -> ConversionResult:
+    """
+    Converts a single song like `convert`, returning a ConversionResult instead of raising.
+    """
+    log = io.StringIO()
+
+    def p(text: str, with_name: bool = True):
+        write_message(log, __package__, text, with_name=with_name)
+
+    try:
+        song_data = convert(xrns, song_config, song_key, config, options, p, pattern_jobs)
+    except ConversionError as e:
+        return ConversionResult(song_key, error=e.error, log=log.getvalue())
+    return ConversionResult(song_key, song_data, log=log.getvalue())
+
+
+def convert_many(songs: dict[str, tuple[str | bytes | BinaryIO, dict]], config: dict | None = None,
+                 options: dict | None = None, executor: Executor | None = None,
+                 pattern_jobs: int = 1) -> dict[str, ConversionResult]:
+    """
+    Converts songs given as (xrns, song_config) pairs by song key, on `executor` if given,
+    and otherwise one after another in this process.
+    Returns the result of every song by song key, in the order they were given.
+    A song failing doesn't stop the others, its result holds the error instead.
+    """
+    xrns_files = [xrns for xrns, _ in songs.values()]
+    song_configs = [song_config for _, song_config in songs.values()]
+    mapper = executor.map if executor else map
+    results = mapper(convert_result, songs.keys(), xrns_files, song_configs, repeat(config), repeat(options),
+                     repeat(pattern_jobs))
+    return {result.song_key: result for result in results}
+
+
+class _TimedWriter:
+    """
+    Wraps a text file, adding up the time spent in its writes.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self.seconds: float = 0.0
+
+    def write(self, text: str) -> int:
+        start = time.perf_counter()
+        count = self._f.write(text)
+        self.seconds += time.perf_counter() - start
+        return count
+
+    def flush(self):
+        start = time.perf_counter()
+        self._f.flush()
+        self.seconds += time.perf_counter() - start
+
+
+def convert_song(song_key: str, data: dict, config: dict, name: str,
+                 cached_key: str | None = None, options: dict | None = None,
+                 stats: bool = False, pattern_jobs: int = 1) -> tuple[bool, str, str | None, SongStats | None]:
+    """
+    Converts a single song entry of the config into its .tres file.
+    Returns whether the conversion succeeded along with everything it logged,
+    so that songs converted in other processes can still report in order,
+    the cache key of the inputs the output now corresponds to,
+    and the stats of the conversion if `stats` is set.
+
+    If the inputs still match `cached_key` and the output exists, nothing is done.
+    Otherwise tracks that are unchanged since the last conversion reuse their previous output.
+    `options` holds the output options given on the command line,
+    and `pattern_jobs` how many processes parse the patterns of a large project.
+    """
+    options = options or {}
+    song_stats = SongStats(song_key) if stats else None
+
+    log = io.StringIO()
+
     def p(text: str, with_name: bool = True):
-        if with_name:
-            name = os.path.basename(sys.argv[0])
-            sys.stderr.write(name + f": {text}\n")
+        write_message(log, name, text, with_name=with_name)
+
+    try:
+        # skip songs that haven't changed since they were last built
+        xrns_filepath = config['global']['xrns_in'] + data['filename'] + '.xrns'
+        output_filepath = config['global']['data_out'] + song_key + '.tres'
+        file_hash = hash_file(xrns_filepath)
+        key = get_song_key(xrns_filepath, data, config, __version__, options, file_hash=file_hash)
+        if key == cached_key and os.path.exists(output_filepath):
+            p(f'{song_key} - up to date')
+            return True, log.getvalue(), key, None
+
+        # load the events of our project file if they were stored since it last changed,
+        # otherwise load the whole project and store its events for the next conversion
+        event_store = EventStore(config['global'].get('event_store', '.renot_events'))
+        event_key = f'{file_hash}:{__version__}'
+        xrns = event_store.get(song_key, event_key)
+        if xrns is None:
+            p(f'{song_key} - loading {xrns_filepath}')
+            xrns = XrnsFile(xrns_filepath, stream=True, pattern_jobs=pattern_jobs)
+            try:
+                event_store.set(song_key, xrns, event_key)
+            except OSError as e:
+                # the store only saves the next conversion a parse, this one can do without it
+                p(f'{song_key} - {e!r}')
+                p("event store save error", with_name=False)
+        else:
+            p(f'{song_key} - loading stored events of {xrns_filepath}')
+
+        # build our output from it
+        if song_stats:
+            start = time.perf_counter()
+        song_data = build_song_data(xrns, song_key, data, config, p, options)
+
+        # write to output, reusing what we wrote for unchanged tracks
+        packed = options.get('format') == 'packed'
+        fragment_cache = FragmentCache(config['global'].get('fragment_cache', '.renot_fragments'))
+
+        def save_fragments(fragments: dict[str, dict], salt: str):
+            # the fragments only save the next conversion some work, our output is complete without them
+            try:
+                fragment_cache.set(song_key, fragments, salt=salt)
+            except OSError as e:
+                p(f'{song_key} - {e!r}')
+                p("fragment cache save error", with_name=False)
+
+        if options.get('split'):
+            salt = __version__ + '/split'
+            fragments = fragment_cache.get(song_key, salt=salt)
+            if song_stats:
+                build_time = time.perf_counter()
+            fragments, reused = write_split_song(song_data, song_key, config, packed, fragments, salt)
+            if song_stats:
+                write_time = time.perf_counter()
+                track_directory = config['global']['data_out'] + song_key
+                add_song_stats(song_stats, xrns, song_data, packed)
+                song_stats.add_time('extract', build_time - start)
+                song_stats.add_time('file write', write_time - build_time)
+                song_stats.count('bytes', os.path.getsize(output_filepath) + sum(
+                    os.path.getsize(os.path.join(track_directory, filename)) for filename in fragments
+                ))
+                song_stats.count('reused tracks', reused)
+            save_fragments(fragments, salt)
+            return True, log.getvalue(), key, song_stats
+
+        fragments = fragment_cache.get(song_key, salt=__version__)
+        filenames = song_data.get_track_filenames()
+        if song_stats:
+            build_time = time.perf_counter()
+            previous = {filename: fragment['fingerprint'] for filename, fragment in fragments.items()}
+            # stream into the file as usual, only telling apart the time spent writing it
+            with open(output_filepath, 'w') as f:
+                writer = _TimedWriter(f)
+                song_data.write_tres(writer, packed=packed, fragments=fragments, salt=__version__)
+                writer.flush()
+            write_time = time.perf_counter()
+            add_song_stats(song_stats, xrns, song_data, packed)
+            song_stats.add_time('extract', build_time - start)
+            song_stats.add_time('serialize', write_time - build_time - writer.seconds)
+            song_stats.add_time('file write', writer.seconds)
+            song_stats.count('bytes', os.path.getsize(output_filepath))
+            song_stats.count('reused tracks', sum(
+                previous.get(filename) == fragments[filename]['fingerprint'] for filename in filenames
+            ))
+        else:
+            with open(output_filepath, 'w') as f:
+                song_data.write_tres(f, packed=packed, fragments=fragments, salt=__version__)
+
+        # only keep the tracks the song still has
+        save_fragments({filename: fragments[filename] for filename in filenames}, __version__)
+    except Exception as e:
+        log.write(name + ": " + repr(e) + "\n")
+        return False, log.getvalue(), None, None
+
+    return True, log.getvalue(), key, song_stats
+
+
+def write_split_song(song_data: GoiseSongData, song_key: str, config: dict, packed: bool,
+                     fragments: dict[str, dict], salt: str = '') -> tuple[dict[str, dict], int]:
+    """
+    Writes a song as a manifest where its .tres file would be, along with a file per track
+    in a directory named after the song, which the manifest lists by their res:// path under
+    the `data_path` global config. Track files that are unchanged since `fragments` were
+    recorded are left as they are, and files of tracks the song no longer has are removed.
+    Returns the fragments of the files now written by file name, and how many were left as they were.
+    """
+    track_directory = config['global']['data_out'] + song_key
+    data_path = config['global'].get('data_path', DEFAULT_DATA_PATH) + song_key + '/'
+    os.makedirs(track_directory, exist_ok=True)
+
+    written: dict[str, dict] = {}
+    reused = 0
+    song_data.track_paths = []
+    for track, filename in zip(song_data.tracks, song_data.get_track_filenames()):
+        track_filepath = os.path.join(track_directory, filename)
+        path = data_path + filename
+        fingerprint = track.get_fingerprint(packed, f'{salt}/{path}')
+        if fragments.get(filename, {}).get('fingerprint') == fingerprint and os.path.exists(track_filepath):
+            reused += 1
         else:
-            name = os.path.basename(sys.argv[0])
-            indent = len(name) * " "
-            sys.stderr.write(indent + f"  {text}\n")
+            with open(track_filepath, 'w') as f:
+                track.write_tres_file(f, packed=packed, seed=path)
+        written[filename] = {'fingerprint': fingerprint}
+        song_data.track_paths.append((track.name, path))
+
+    for filename in os.listdir(track_directory):
+        if filename.endswith('.tres') and filename not in written:
+            os.remove(os.path.join(track_directory, filename))
+
+    with open(config['global']['data_out'] + song_key + '.tres', 'w') as f:
+        song_data.write_tres_manifest(f)
+    return written, reused
+
+
+def add_song_stats(song_stats: SongStats, xrns: XrnsFile, song_data: GoiseSongData, packed: bool = False):
+    """
+    Records how long loading took and how much was read and written.
+    """
+    for stage, seconds in xrns.timings.items():
+        song_stats.add_time(stage, seconds)
+
+    song_stats.count('patterns', len(xrns.patterns))
+    song_stats.count('lines', sum(pattern.lines for pattern in xrns.patterns))
+    song_stats.count('note columns', sum(len(track.line) for pattern in xrns.patterns for track in pattern.tracks))
+    song_stats.count('effect columns', sum(len(track.fx_line) for pattern in xrns.patterns for track in pattern.tracks))
+    for track in song_data.tracks:
+        effects = sum(len(note.effects) for note in track.notes)
+        song_stats.count('notes', len(track.notes))
+        song_stats.count('effects', effects)
+        song_stats.count_instrument(track.name, 'notes', len(track.notes))
+        song_stats.count_instrument(track.name, 'effects', effects)
+    song_stats.count('resources', song_data.get_load_steps(packed) - 1)
+
+
+def convert_songs(songs: dict[str, dict], config: dict, name: str, cache: BuildCache, options: dict,
+                  executor: Executor | None = None, force: bool = False, stats: Stats | None = None,
+                  pattern_jobs: int = 1) -> int:
+    """
+    Converts the given songs of the config, on `executor` if given, and records
+    what they were built from in `cache`. Returns how many of them failed.
+    The stats of every song that was converted are added to `stats` if given.
+    """
+    cached_keys = [None if force else cache.get(song_key) for song_key in songs]
+    mapper = executor.map if executor else map
+    results = mapper(convert_song, songs.keys(), songs.values(), repeat(config), repeat(name), cached_keys, repeat(options),
+                     repeat(stats is not None), repeat(pattern_jobs))
+
+    # logs are written per song in config order as soon as they are available
+    failures = 0
+    for song_key, (success, log, key, song_stats) in zip(songs, results):
+        sys.stderr.write(log)
+        failures += not success
+        if success:
+            cache.set(song_key, key)
+        if song_stats:
+            stats.add(song_stats)
+    return failures
+
+
+def write_stats(stats: Stats, path: str):
+    """
+    Writes stats as text to stderr for '-', or as json to a file otherwise.
+    """
+    if path == '-':
+        stats.write_text(sys.stderr)
+    else:
+        with open(path, 'w') as f:
+            stats.write_json(f)
+
+
+def resolve_config_paths(config: dict, config_path: str) -> dict:
+    """
+    Makes the relative paths of a config's global entry relative to the config file,
+    so that the same config works from any working directory.
+    """
+    directory = os.path.dirname(config_path)
+    for key in ('xrns_in', 'data_out', 'cache', 'fragment_cache', 'event_store'):
+        path = config['global'].get(key)
+        if path and not os.path.isabs(path):
+            config['global'][key] = os.path.join(directory, path)
+    return config
+
+
+def get_song_filepath(config: dict, data: dict) -> str:
+    return os.path.normpath(config['global']['xrns_in'] + data['filename'] + '.xrns')
+
+
+def watch_songs(config_path: str, config: dict, name: str, cache: BuildCache, options: dict,
+                executor: Executor | None = None, debounce: float = 0.5, poll: bool = False,
+                stats_path: str | None = None, pattern_jobs: int = 1) -> int:
+    """
+    Keeps converting songs whenever their project file or the config changes, until interrupted.
+    Only the songs of changed project files are looked at, the rest stay as they are.
+    With `stats_path` set, the stats of every rebuild are written there.
+    """
+    def p(text: str, with_name: bool = True):
+        write_message(sys.stderr, name, text, with_name=with_name)
+
+    from .watch import Watcher
+
+    config_path = os.path.normpath(config_path)
+    watcher = None
+    try:
+        while True:
+            if watcher is None:
+                watcher = Watcher([config['global']['xrns_in'], config_path], use_inotify=not poll)
+                p(f'watching {config["global"]["xrns_in"]} and {config_path}' + ('' if watcher.using_inotify else ' (polling)'))
+
+            changed = watcher.wait(debounce)
+
+            songs: dict[str, dict] = config['songs']
+            if config_path in changed:
+                # a new config may change any song, the cache keys tell which
+                try:
+                    with open(config_path) as f:
+                        new_config: dict = resolve_config_paths(json.load(f), config_path)
+                except Exception as e:
+                    p(repr(e))
+                    p("config load error, keeping the previous config", with_name=False)
+                    continue
+
+                if new_config['global']['xrns_in'] != config['global']['xrns_in']:
+                    watcher.close()
+                    watcher = None
+                config = new_config
+                songs = config['songs']
+            else:
+                songs = {
+                    song_key: data for song_key, data in songs.items()
+                    if get_song_filepath(config, data) in changed
+                }
+
+            if not songs:
+                continue
+
+            stats = Stats() if stats_path else None
+            failures = convert_songs(songs, config, name, cache, options, executor, stats=stats,
+                                     pattern_jobs=pattern_jobs)
+            try:
+                cache.save()
+                if stats:
+                    write_stats(stats, stats_path)
+            except OSError as e:
+                p(repr(e))
+                p("cache or stats save error", with_name=False)
+            if failures:
+                p(f'{failures} of {len(songs)} songs failed')
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if watcher:
+            watcher.close()
+
+
+def main(argv=None):
+    name = __package__ or os.path.basename(sys.argv[0])
+    argv = argv or sys.argv[1:]
+
+    # measuring exported charts has arguments of its own
+    if argv and argv[0] == 'stats':
+        from .charts import main as charts_main
+        return charts_main(argv[1:], prog=f'{name} stats')
+
+    def p(text: str, with_name: bool = True):
+        write_message(sys.stderr, name, text, with_name=with_name)
 
     # try parsing arguments
     try:
         parser = argparse.ArgumentParser(
+            prog=name,
             epilog='Convert Renoise project files into a Goise resource (a Godot plugin)',
             description='MIT License 2023 - Micah Nichols'
         )
         parser.add_argument('-c', '--config', dest='config', default='config.json', type=str, help='path to a config json file')
+        parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int, help='number of songs to convert in parallel, 0 for one per cpu')
+        parser.add_argument('--pattern-jobs', dest='pattern_jobs', default=1, type=int, help='number of processes parsing the patterns of each large project')
+        parser.add_argument('-f', '--force', dest='force', action='store_true', help='convert every song, even ones that are up to date')
+        parser.add_argument('--format', dest='format', default='resources', choices=['resources', 'packed'], help='write one resource per note, or packed arrays per track')
+        parser.add_argument('--split', dest='split', action='store_true', help='write a manifest per song and a resource per track, which Goise loads only once listened to')
+        parser.add_argument('--effects', dest='effects', action='store_true', help='export volume, panning and pitch automation as note effects')
+        parser.add_argument('--effect-tolerance', dest='effect_tolerance', default=0.01, type=float, help='how far compacted automation may stray from the song')
+        parser.add_argument('-w', '--watch', dest='watch', action='store_true', help='keep running and convert songs again whenever they are saved')
+        parser.add_argument('--debounce', dest='debounce', default=0.5, type=float, help='seconds of quiet to wait for after a change before converting')
+        parser.add_argument('--poll', dest='poll', action='store_true', help='poll for changes instead of using inotify')
+        parser.add_argument('--stats', dest='stats', nargs='?', const='-', default=None, type=str, help='report timings and counts per song, to stderr or - by default, or as json to a file')
+        parser.add_argument('--profile', dest='profile', default=None, type=str, help='run under cProfile and dump pstats to a file, converting every song in this process')
 
-        args = parser.parse_args(argv or sys.argv[1:])
+        args = parser.parse_args(argv)
 
     except Exception as e:
         p(repr(e))
@@ -45,99 +726,79 @@ def main(argv=None):
     # try to load json
     try:
         with open(args.config) as f:
-            config: dict = json.load(f)
+            config: dict = resolve_config_paths(json.load(f), args.config)
     except Exception as e:
         p(repr(e))
         p("config load error", with_name=False)
         return 2
 
-    # iterate over each song
-    for song_key, data in config['songs'].items():
+    # options that change the output of every song
+    options = {'format': args.format}
+    if args.split:
+        options.update(split=True)
+    if args.effects:
+        options.update(effects=True, effect_tolerance=args.effect_tolerance)
+
+    # profile the conversion itself, which means keeping every song in this process
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        args.jobs = 1
         try:
-            # load our project file
-            xrns_filepath = config['global']['xrns_in'] + data['filename'] + '.xrns'
-            p(f'{song_key} - loading {xrns_filepath}')
-            xrns = XrnsFile(xrns_filepath)
-
-            # useful constants
-            pattern_order: list[int] = xrns.pattern_sequence.order
-
-            # determine the bpm map
-            bpm_map = {0: xrns.global_song_data.bpm}
-            lpb_map = {0: xrns.global_song_data.lpb}
-
-            # start creating our output file
-            song_data = GoiseSongData(
-                song_path=config['global']['music_path'] + data['filename'] + config['global']['song_fileformat'],
-                bpm_map=bpm_map,
-                lpb_map=lpb_map,
-            )
-
-            # iterate over each instrument name
-            for inst_name, inst_data in data['insts'].items():
-                # find the index of this instrument
-                for i, xrns_instrument in enumerate(xrns.instruments):
-                    if xrns_instrument.name == inst_name:
-                        instrument_index = i
-                        break
-                else:
-                    p(f'{song_key} - could not find {inst_name} in {data["name"]}')
-                    continue
+            return profiler.runcall(run, args, config, name, options)
+        finally:
+            profiler.dump_stats(args.profile)
+            p(f'profile written to {args.profile}')
 
-                # get instrument globals
-                transpose = xrns_instrument.transpose
-
-                # create our instrument type
-                p(f'{song_key} - building instrument {inst_name}')
-                instrument = GoiseTrack(name=inst_data.get('name', inst_name))
-                song_data.add_track(instrument)
-
-                # iterate over each track at a time, looking for this instrument data
-                current_note: GoiseNote | None = None
-                for track_index in range(len(xrns.tracks)):
-                    global_line_index = 0
-
-                    for pattern_index in pattern_order:
-                        # ok cool! we are looking at this pattern now
-                        pattern: Pattern = xrns.patterns[pattern_index]
-                        track: Pattern.PatternTrack = pattern.tracks[track_index]
-
-                        for local_line_index, line in track.lines.items():
-                            line_index = global_line_index + local_line_index
-
-                            for note in line.notes:
-                                delay_time = note.delay / 256
-                                if note.note == 'OFF' and current_note:
-                                    # we cancel the current note
-                                    current_note.end = line_index + delay_time
-                                    current_note = None
-                                elif note.instrument == instrument_index:
-                                    # we start using this instrument
-                                    noteobj = Note.from_string(note.note)
-                                    noteobj.transpose(transpose)
-                                    current_note = GoiseNote(
-                                        note=noteobj,
-                                        beat=line_index + delay_time,
-                                        end=0.0,
-                                    )
-                                    instrument.add_note(current_note)
-
-                            if current_note:
-                                for effect in line.effects:
-                                    pass
-
-                        # increase time by lines iterated over
-                        global_line_index += pattern.lines
-
-            # write to output
-            with open(config['global']['data_out'] + song_key + '.tres', 'w') as f:
-                f.write(song_data.get_tres_string())
-        except Exception as e:
-            name = os.path.basename(sys.argv[0])
-            sys.stderr.write(name + ": " + repr(e) + "\n")
-            continue
+    return run(args, config, name, options)
+
+
+def run(args: argparse.Namespace, config: dict, name: str, options: dict) -> int:
+    def p(text: str, with_name: bool = True):
+        write_message(sys.stderr, name, text, with_name=with_name)
+
+    # load what every song was last built from
+    cache = BuildCache(config['global'].get('cache', '.renot_cache.json'))
+    stats = Stats() if args.stats else None
+
+    # convert each song, in parallel if requested
+    songs: dict[str, dict] = config['songs']
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    jobs = jobs if args.watch else min(jobs, len(songs)) or 1
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        failures = convert_songs(songs, config, name, cache, options, executor, args.force, stats, args.pattern_jobs)
+
+        # remember what we built
+        try:
+            cache.save()
+        except OSError as e:
+            p(repr(e))
+            p("cache save error", with_name=False)
+
+        # report where the time went
+        if stats:
+            try:
+                write_stats(stats, args.stats)
+            except OSError as e:
+                p(repr(e))
+                p("stats save error", with_name=False)
+
+        # the same workers keep serving every later conversion
+        if args.watch:
+            return watch_songs(args.config, config, name, cache, options, executor, args.debounce, args.poll, args.stats,
+                               args.pattern_jobs)
+    finally:
+        if executor:
+            executor.shutdown()
 
     # completion
+    if failures:
+        p(f'{failures} of {len(songs)} songs failed')
+        return 1
     return 0
 
 
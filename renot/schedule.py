@@ -0,0 +1,92 @@
+"""
+This module builds the scheduling index exported with each track, and is the reference
+for how GoiseSong queries it in the Goise addon.
+
+A listener processes a note from its cue (beat + cue, with cue negative) until it ends,
+where a note without an end ends at its beat. With notes sorted by beat and the running
+maximum of their ends, the notes a listener may have to process at a line are a single
+contiguous range found by two binary searches, so a frame only touches notes near the playhead.
+"""
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable
+
+
+def get_effective_end(beat: float, end: float) -> float:
+    """
+    Returns the line a note stops being processed at.
+    """
+    return beat if end == 0 else max(beat, end)
+
+
+class ScheduleIndex:
+    """
+    Sorted note beats along with the latest effective end of every note up to each one.
+    """
+
+    def __init__(self, beats: Iterable[float] = (), ends: Iterable[float] = ()):
+        self.beats: array = array('d')
+        self.ends: array = array('d')
+
+        latest = float('-inf')
+        for beat, end in zip(beats, ends):
+            if self.beats and beat < self.beats[-1]:
+                raise ValueError('notes must be sorted by beat')
+            latest = max(latest, get_effective_end(beat, end))
+            self.beats.append(beat)
+            self.ends.append(latest)
+
+    @classmethod
+    def from_notes(cls, notes: list) -> 'ScheduleIndex':
+        """
+        Builds the index of a list of GoiseNotes, which must be sorted by beat.
+        """
+        return cls((note.beat for note in notes), (note.end for note in notes))
+
+    def __len__(self) -> int:
+        return len(self.beats)
+
+    """
+    Queries
+    """
+
+    def get_window(self, line: float, cue: float = 0.0) -> range:
+        """
+        Returns the indices of the notes that may need processing at a line.
+        Every note before the window has ended, every note after it hasn't been cued yet.
+        """
+        lo = bisect_right(self.ends, line)
+        hi = bisect_right(self.beats, line - cue)
+        return range(lo, max(lo, hi))
+
+    def get_active(self, line: float, cue: float, notes: list) -> list[int]:
+        """
+        Returns the indices of the notes that are between their cue and end at a line.
+        The window may also hold notes that ended before a longer note did, which are skipped.
+        """
+        return [
+            i for i in self.get_window(line, cue)
+            if line < get_effective_end(notes[i].beat, notes[i].end)
+        ]
+
+
+if __name__ == '__main__':
+    from random import Random
+    from types import SimpleNamespace
+
+    # check the index against going over every note
+    random = Random(0)
+    notes = sorted((
+        SimpleNamespace(beat=float(beat), end=random.choice([0.0, beat + random.uniform(-2, 16)]))
+        for beat in (random.randrange(256) for _ in range(500))
+    ), key=lambda n: n.beat)
+    index = ScheduleIndex.from_notes(notes)
+
+    for _ in range(2000):
+        line = random.uniform(-8, 280)
+        cue = -random.uniform(0.25, 8)
+        expected = [i for i, n in enumerate(notes) if n.beat + cue <= line < get_effective_end(n.beat, n.end)]
+        assert index.get_active(line, cue, notes) == expected, (line, cue)
+
+    window = index.get_window(128, -1)
+    print(f'{len(index)} notes, {len(window)} in the window at line 128, all queries match')
@@ -0,0 +1,244 @@
+"""
+This module replays a GoiseSongData the way GoiseSong does in the Goise addon,
+so that note scheduling can be checked and benchmarked without running Godot.
+
+Each note goes through WAIT -> CUED -> HIT -> RELEASED per listener, calling the same
+listener methods as GoiseNoteListener. Like GoiseSong, each frame only looks at the notes
+in the scheduling window of a track, along with notes that were cued or hit before.
+"""
+from enum import IntEnum, auto
+
+from .goise import GoiseSongData, GoiseTrack, GoiseNote
+from .schedule import ScheduleIndex
+
+
+class NoteState(IntEnum):
+    WAIT = auto()
+    CUED = auto()
+    HIT = auto()
+    RELEASED = auto()
+
+
+def inverse_lerp(start: float, end: float, value: float) -> float:
+    return (value - start) / (end - start)
+
+
+class NoteListener:
+    """
+    A Python version of GoiseNoteListener, which counts the calls it receives.
+    `cue` is how many lines before its beat a note starts, as a negative number.
+    With `record` set, every call is also kept in `events` as (method, note).
+    """
+
+    def __init__(self, inst_name: str = 'snare', cue: float = -1, record: bool = False):
+        self.inst_name: str = inst_name
+        self.cue: float = cue
+        self.counts: dict[str, int] = {'start': 0, 'hit': 0, 'process': 0, 'release': 0}
+        self.events: list[tuple[str, GoiseNote]] | None = [] if record else None
+
+    def start_note(self, note: GoiseNote):
+        self._record('start', note)
+
+    def hit_note(self, note: GoiseNote):
+        self._record('hit', note)
+
+    def release_note(self, note: GoiseNote):
+        self._record('release', note)
+
+    def process_note(self, note: GoiseNote, t: float, end: float):
+        self._record('process', note)
+
+    def _record(self, method: str, note: GoiseNote):
+        self.counts[method] += 1
+        if self.events is not None:
+            self.events.append((method, note))
+
+
+class SongSimulator:
+    """
+    Plays a song's notes to listeners, one frame at a time.
+
+    Each listener sweeps a cursor over the notes of its tracks in beat order, keeping only
+    the notes between their cue and release. A frame costs O(active notes) here, while `work`
+    counts the notes GoiseSong looks at for the same frame, its window plus the notes still
+    to be released before it.
+    """
+
+    def __init__(self, song_data: GoiseSongData):
+        self.song_data: GoiseSongData = song_data
+        self.tempo_map = song_data.get_tempo_map()
+        self.listeners: dict[str, list[NoteListener]] = {}
+
+        # Tracks with their notes in export order, and the scheduling index over them.
+        self.tracks: list[tuple[GoiseTrack, list[GoiseNote], ScheduleIndex]] = []
+        for track in song_data.tracks:
+            notes = sorted(track.notes, key=lambda n: n.beat)
+            self.tracks.append((track, notes, ScheduleIndex.from_notes(notes)))
+
+        # State, per listener and track: the next note to cue and the states of the notes after their cue.
+        self.last_t: float = 0.0
+        self.cursors: dict[tuple[NoteListener, int], int] = {}
+        self.active: dict[tuple[NoteListener, int], dict[int, NoteState]] = {}
+
+        # Work done, in notes looked at by GoiseSong.
+        self.frames: int = 0
+        self.work: int = 0
+        self.max_work: int = 0
+
+    """
+    Listeners
+    """
+
+    def attach_listener(self, listener: NoteListener):
+        self.listeners.setdefault(listener.inst_name, []).append(listener)
+
+    def detach_listener(self, listener: NoteListener):
+        listeners = self.listeners.get(listener.inst_name)
+        if not listeners or listener not in listeners:
+            return
+        listeners.remove(listener)
+        if not listeners:
+            del self.listeners[listener.inst_name]
+        for key in [key for key in self.cursors if key[0] is listener]:
+            del self.cursors[key]
+            del self.active[key]
+
+    """
+    Playback
+    """
+
+    def process(self, t: float) -> int:
+        """
+        Processes a single frame at a playback position in seconds.
+        Returns how many notes GoiseSong would have looked at.
+        """
+        line = self.tempo_map.get_line(t)
+        if self.last_t > t:
+            # Playback went back, so every note can be played again.
+            self.cursors = {}
+            self.active = {}
+        self.last_t = t
+
+        work = 0
+        for track_index, (track, notes, schedule) in enumerate(self.tracks):
+            for listener in self.listeners.get(track.name, ()):
+                key = (listener, track_index)
+                active = self.active.setdefault(key, {})
+                window = schedule.get_window(line, listener.cue)
+                work += len(window) + sum(1 for i in active if i < window.start)
+
+                # Notes before the window ended without being cued, and will never be.
+                cursor = max(self.cursors.get(key, 0), window.start)
+                for i in range(cursor, window.stop):
+                    active[i] = NoteState.WAIT
+                self.cursors[key] = max(cursor, window.stop)
+
+                for i, state in list(active.items()):
+                    state = self._process_note(listener, notes[i], state, line)
+                    if state is None:
+                        del active[i]
+                    else:
+                        active[i] = state
+
+        self.frames += 1
+        self.work += work
+        self.max_work = max(self.max_work, work)
+        return work
+
+    def play(self, duration: float | None = None, fps: float = 60.0, start: float = 0.0):
+        """
+        Processes frames at a fixed rate from `start` for `duration` seconds,
+        by default until the last note has ended.
+        """
+        if duration is None:
+            duration = self.get_length() - start
+        frames = int(duration * fps) + 1
+        for frame in range(frames):
+            self.process(start + frame / fps)
+
+    def seek(self, t: float) -> int:
+        """
+        Jumps to a playback position, processing a single frame there.
+        """
+        return self.process(t)
+
+    def get_length(self) -> float:
+        """
+        Returns the time in seconds the last note ends at.
+        """
+        lines = [max(note.beat, note.end) for _, notes, _ in self.tracks for note in notes]
+        return self.tempo_map.get_time(max(lines)) if lines else 0.0
+
+    @staticmethod
+    def _process_note(listener: NoteListener, note: GoiseNote, state: NoteState, line: float) -> NoteState | None:
+        """
+        Moves a note along, returning its new state or None once nothing will happen to it anymore.
+        """
+        zero_beat = note.beat + listener.cue
+        one_beat = note.beat
+        end_beat = 1.0
+        if note.end != 0.0:
+            end_beat = inverse_lerp(zero_beat, one_beat, note.end)
+        beat_delta = inverse_lerp(zero_beat, one_beat, line)
+
+        if beat_delta < 0:
+            # The note is not ready to be processed.
+            return state
+        elif beat_delta < 1.0:
+            # The note is ready to process.
+            if state == NoteState.WAIT:
+                state = NoteState.CUED
+                listener.start_note(note)
+            listener.process_note(note, beat_delta, end_beat)
+        elif beat_delta < end_beat:
+            # The note has been hit.
+            if state == NoteState.WAIT:
+                # Skipped past its cue, which GoiseSong never plays.
+                return None
+            if state == NoteState.CUED:
+                state = NoteState.HIT
+                listener.hit_note(note)
+            listener.process_note(note, beat_delta, end_beat)
+        else:
+            # The note is ended.
+            if state == NoteState.CUED:
+                listener.hit_note(note)
+            if state != NoteState.WAIT:
+                listener.process_note(note, end_beat, end_beat)
+                listener.release_note(note)
+            return None
+        return state
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+
+    from .renot import build_song_data
+    from .xrns import XrnsFile
+
+    parser = argparse.ArgumentParser(description='Play a song of a renot config to listeners on every instrument')
+    parser.add_argument('song', type=str, help='key of the song in the config')
+    parser.add_argument('-c', '--config', dest='config', default='config.json', type=str, help='path to a config json file')
+    parser.add_argument('--fps', dest='fps', default=60.0, type=float, help='frames per second')
+    parser.add_argument('--cue', dest='cue', default=-1.0, type=float, help='lines a note is cued before its beat, negative')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    data = config['songs'][args.song]
+    xrns = XrnsFile(config['global']['xrns_in'] + data['filename'] + '.xrns', stream=True, instruments=data['insts'].keys())
+    simulator = SongSimulator(build_song_data(xrns, args.song, data, config))
+    listeners = [NoteListener(track.name, args.cue) for track in simulator.song_data.tracks]
+    for listener in listeners:
+        simulator.attach_listener(listener)
+
+    start = time.perf_counter()
+    simulator.play(fps=args.fps)
+    elapsed = time.perf_counter() - start
+
+    print(f'{simulator.frames} frames over {simulator.get_length():.1f}s in {elapsed * 1000:.1f} ms')
+    print(f'notes looked at: {simulator.work} total, {simulator.work / max(simulator.frames, 1):.1f} per frame, {simulator.max_work} at most')
+    for listener in listeners:
+        print(f'{listener.inst_name}: ' + ', '.join(f'{method} {count}' for method, count in listener.counts.items()))
@@ -0,0 +1,110 @@
+"""
+This module collects where the time goes while converting songs,
+so that slow songs stand out and optimizations can be checked.
+"""
+import json
+import time
+from contextlib import contextmanager
+from typing import TextIO
+
+
+class SongStats:
+    """
+    Stage timings and counts of a single song conversion.
+    Stages and counts keep the order they were first recorded in.
+    """
+
+    def __init__(self, song_key: str):
+        self.song_key: str = song_key
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.instruments: dict[str, dict[str, int]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def count_instrument(self, inst_name: str, name: str, amount: int = 1):
+        counts = self.instruments.setdefault(inst_name, {})
+        counts[name] = counts.get(name, 0) + amount
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+    def to_dict(self) -> dict:
+        return {
+            'song': self.song_key,
+            'total': self.total,
+            'stages': self.stages,
+            'counts': self.counts,
+            'instruments': self.instruments,
+        }
+
+    def write_text(self, f: TextIO):
+        f.write(f'{self.song_key}: {self.total * 1000:.1f} ms\n')
+        width = max((len(name) for name in self.stages), default=0)
+        for name, seconds in self.stages.items():
+            f.write(f'  {name.ljust(width)}  {seconds * 1000:9.1f} ms\n')
+        if self.counts:
+            f.write('  ' + ', '.join(f'{name} {amount}' for name, amount in self.counts.items()) + '\n')
+        for inst_name, counts in self.instruments.items():
+            f.write(f'  {inst_name}: ' + ', '.join(f'{name} {amount}' for name, amount in counts.items()) + '\n')
+
+
+class Stats:
+    """
+    The stats of every song converted in a run.
+    """
+
+    def __init__(self):
+        self.songs: list[SongStats] = []
+
+    def add(self, song_stats: SongStats):
+        self.songs.append(song_stats)
+
+    def get_totals(self) -> SongStats:
+        totals = SongStats('total')
+        for song in self.songs:
+            for name, seconds in song.stages.items():
+                totals.add_time(name, seconds)
+            for name, amount in song.counts.items():
+                totals.count(name, amount)
+        return totals
+
+    def write_text(self, f: TextIO):
+        for song in self.songs:
+            song.write_text(f)
+        if len(self.songs) > 1:
+            self.get_totals().write_text(f)
+
+    def write_json(self, f: TextIO):
+        json.dump({
+            'songs': [song.to_dict() for song in self.songs],
+            'total': self.get_totals().to_dict(),
+        }, f, indent=2)
+        f.write('\n')
+
+
+if __name__ == '__main__':
+    import sys
+
+    stats = Stats()
+    song_stats = SongStats('demo')
+    with song_stats.stage('sleep'):
+        time.sleep(0.01)
+    song_stats.count('naps')
+    song_stats.count_instrument('kick', 'notes', 4)
+    stats.add(song_stats)
+    stats.write_text(sys.stdout)
+    stats.write_json(sys.stdout)
@@ -0,0 +1,116 @@
+"""
+This module converts between song lines and seconds for songs with tempo changes.
+The same lookup is done by GoiseSongData in the Goise addon, using the table exported here.
+"""
+from bisect import bisect_right
+
+
+class TempoMap:
+    """
+    Maps lines to seconds and back, given the bpm and lpb changes of a song.
+
+    The map is split into segments of constant speed. The line and time each segment
+    starts at are precomputed, so every lookup is a binary search.
+    """
+
+    def __init__(self, bpm_map: dict[float, float] = None, lpb_map: dict[float, float] = None):
+        self.bpm_map: dict[float, float] = dict(bpm_map or {0: 120})
+        self.lpb_map: dict[float, float] = dict(lpb_map or {0: 4})
+
+        # Segment table, built on demand.
+        self._lines: list[float] | None = None
+        self._times: list[float] = []
+        self._rates: list[float] = []
+
+    """
+    Building
+    """
+
+    def set_bpm(self, line: float, bpm: float):
+        self.bpm_map[line] = bpm
+        self._lines = None
+
+    def set_lpb(self, line: float, lpb: float):
+        self.lpb_map[line] = lpb
+        self._lines = None
+
+    def build(self):
+        """
+        Computes the segment table out of the bpm and lpb maps.
+        """
+        lines: list[float] = []
+        times: list[float] = []
+        rates: list[float] = []
+
+        # Values from before the first change also apply to everything before it.
+        bpm = self.bpm_map[min(self.bpm_map)]
+        lpb = self.lpb_map[min(self.lpb_map)]
+        for line in sorted(self.bpm_map.keys() | self.lpb_map.keys()):
+            bpm = self.bpm_map.get(line, bpm)
+            lpb = self.lpb_map.get(line, lpb)
+            rate = bpm * lpb / 60  # lines per second
+
+            if not lines:
+                lines.append(line)
+                times.append(0.0 if line <= 0 else line / rate)
+                rates.append(rate)
+                continue
+            if rate == rates[-1]:
+                continue
+
+            times.append(times[-1] + (line - lines[-1]) / rates[-1])
+            lines.append(line)
+            rates.append(rate)
+
+        # Lines before the first change run at its speed from line 0.
+        if lines[0] > 0:
+            lines.insert(0, 0)
+            times.insert(0, 0.0)
+            rates.insert(0, rates[0])
+
+        self._lines, self._times, self._rates = lines, times, rates
+
+    @property
+    def lines(self) -> list[float]:
+        if self._lines is None:
+            self.build()
+        return self._lines
+
+    @property
+    def times(self) -> list[float]:
+        if self._lines is None:
+            self.build()
+        return self._times
+
+    @property
+    def rates(self) -> list[float]:
+        if self._lines is None:
+            self.build()
+        return self._rates
+
+    """
+    Lookups
+    """
+
+    def get_time(self, line: float) -> float:
+        """
+        Returns the time in seconds a line is played at.
+        """
+        lines = self.lines
+        i = max(bisect_right(lines, line) - 1, 0)
+        return self._times[i] + (line - lines[i]) / self._rates[i]
+
+    def get_line(self, time: float) -> float:
+        """
+        Returns the line that is played at a time in seconds.
+        """
+        times = self.times
+        i = max(bisect_right(times, time) - 1, 0)
+        return self._lines[i] + (time - times[i]) * self._rates[i]
+
+
+if __name__ == '__main__':
+    tempo_map = TempoMap({0: 120, 64: 60}, {0: 4, 128: 8})
+    for line in (0, 32, 64, 96, 128, 160):
+        time = tempo_map.get_time(line)
+        print(f'line {line} -> {time}s -> line {tempo_map.get_line(time)}')
@@ -0,0 +1,572 @@
+"""
+This module reads Goise resources back out of the text resource (.tres) files Godot and renot write,
+rebuilding the GoiseSongData they hold along with every track, note and effect.
+
+Files are read line by line, and each section is turned into its Goise object as soon as it ends.
+Sub resources always come before whatever references them, so a single pass is enough.
+"""
+import os
+from typing import Iterator, NamedTuple, TextIO
+
+from .goise import GoiseSongData, GoiseTrack, GoiseNote, GoiseEffect
+from .note import Note
+
+
+class ResourceRef(NamedTuple):
+    """
+    A reference to another resource, such as SubResource("Resource_abcde").
+    `kind` is the constructor used, `target` its id or path.
+    """
+    kind: str
+    target: str
+
+
+class Section(NamedTuple):
+    """
+    A section of a resource file: its header tag and attributes, and the properties below it.
+    """
+    tag: str
+    attributes: dict
+    properties: dict
+
+
+_OPENERS = {'(': 1, '[': 1, '{': 1, ')': -1, ']': -1, '}': -1}
+_WHITESPACE = ' \t\r\n'
+_NUMBER_STARTS = frozenset('0123456789+-.')
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+_NAME_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+_REFERENCE_KINDS = frozenset(('SubResource', 'ExtResource', 'Resource'))
+_CONSTANTS = {'true': True, 'false': False, 'null': None, 'inf': float('inf'), 'inf_neg': float('-inf'), 'nan': float('nan')}
+
+
+def get_depth_change(text: str) -> int:
+    """
+    Returns how many more brackets a piece of a value opens than it closes, ignoring strings.
+    """
+    if '"' in text and '\\' not in text:
+        # Without escapes, every other piece between quotes is inside a string.
+        text = ''.join(text.split('"')[::2])
+    if '"' not in text:
+        return (text.count('(') + text.count('[') + text.count('{')
+                - text.count(')') - text.count(']') - text.count('}'))
+
+    depth = 0
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        else:
+            depth += _OPENERS.get(char, 0)
+    return depth
+
+
+class _Parser:
+    """
+    A recursive descent parser for a single Variant value, such as the right side of a property.
+    Every character is looked at once, there is no backtracking.
+    """
+
+    __slots__ = ('text', 'pos')
+
+    def __init__(self, text: str):
+        self.text: str = text
+        self.pos: int = 0
+
+    def parse(self):
+        value = self.value()
+        self.skip()
+        if self.pos != len(self.text):
+            raise self.error('unexpected trailing text')
+        return value
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f'{message} at {self.pos}: {self.text[self.pos:self.pos + 32]!r}')
+
+    def skip(self):
+        text = self.text
+        pos = self.pos
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def expect(self, char: str):
+        self.skip()
+        if self.text[self.pos:self.pos + 1] != char:
+            raise self.error(f'expected {char!r}')
+        self.pos += 1
+
+    """
+    Values
+    """
+
+    def value(self):
+        self.skip()
+        if self.pos >= len(self.text):
+            raise self.error('expected a value')
+
+        char = self.text[self.pos]
+        if char == '"':
+            return self.string()
+        if char in _NUMBER_STARTS:
+            return self.number()
+        if char == '{':
+            self.pos += 1
+            return self.dictionary()
+        if char == '[':
+            self.pos += 1
+            return self.sequence(']')
+        if char in '&^' and self.text[self.pos + 1:self.pos + 2] == '"':
+            # StringNames and NodePaths are read as plain strings.
+            self.pos += 1
+            return self.string()
+
+        name = self.name()
+        if name in _CONSTANTS:
+            return _CONSTANTS[name]
+
+        if name in _REFERENCE_KINDS and self.text.startswith('("', self.pos):
+            # References make up most of long arrays, so they skip the general path.
+            end = self.text.find('")', self.pos + 2)
+            target = self.text[self.pos + 2:end]
+            if end >= 0 and '"' not in target and '\\' not in target:
+                self.pos = end + 2
+                return ResourceRef(name, target)
+
+        self.skip()
+        char = self.text[self.pos:self.pos + 1]
+        if char == '[':
+            # A typed container such as Array[float]([...]), only its contents matter.
+            self.pos += 1
+            self.type()
+            self.expect(']')
+            self.expect('(')
+            value = self.value()
+            self.expect(')')
+            return value
+        if char == '(':
+            self.pos += 1
+            args = self.sequence(')')
+            if name in _REFERENCE_KINDS:
+                return ResourceRef(name, args[0])
+            if name.startswith('Packed'):
+                return args
+            return tuple(args)
+        raise self.error(f'unexpected {name!r}')
+
+    def type(self):
+        self.skip()
+        self.name()
+        self.skip()
+        if self.text[self.pos:self.pos + 1] == '(':
+            self.pos += 1
+            self.sequence(')')
+
+    def name(self) -> str:
+        text = self.text
+        start = pos = self.pos
+        while pos < len(text) and text[pos] in _NAME_CHARS:
+            pos += 1
+        if pos == start:
+            raise self.error('expected a name')
+        self.pos = pos
+        return text[start:pos]
+
+    def number(self) -> int | float:
+        text = self.text
+        start = pos = self.pos
+        while pos < len(text) and text[pos] in _NUMBER_CHARS:
+            pos += 1
+        self.pos = pos
+        token = text[start:pos]
+        if '.' in token or 'e' in token or 'E' in token:
+            return float(token)
+        return int(token)
+
+    def string(self) -> str:
+        text = self.text
+        start = self.pos + 1
+        end = text.find('"', start)
+        backslash = text.find('\\', start)
+        if end < 0:
+            raise self.error('unterminated string')
+        if backslash < 0 or backslash > end:
+            self.pos = end + 1
+            return text[start:end]
+
+        # Only strings with escapes are decoded a character at a time.
+        chars = []
+        pos = start
+        while pos < len(text):
+            char = text[pos]
+            if char == '\\' and pos + 1 < len(text):
+                chars.append(_ESCAPES.get(text[pos + 1], text[pos + 1]))
+                pos += 2
+            elif char == '"':
+                self.pos = pos + 1
+                return ''.join(chars)
+            else:
+                chars.append(char)
+                pos += 1
+        raise self.error('unterminated string')
+
+    def sequence(self, close: str) -> list:
+        text = self.text
+        items = []
+        while True:
+            self.skip()
+            if text[self.pos:self.pos + 1] == close:
+                self.pos += 1
+                return items
+            if text.startswith('SubResource("', self.pos):
+                # Arrays of sub resources are by far the longest values.
+                start = self.pos + 13
+                end = text.find('")', start)
+                if end >= 0 and '"' not in text[start:end]:
+                    items.append(ResourceRef('SubResource', text[start:end]))
+                    self.pos = end + 2
+                else:
+                    items.append(self.value())
+            else:
+                items.append(self.value())
+            self.skip()
+            char = self.text[self.pos:self.pos + 1]
+            if char == ',':
+                self.pos += 1
+            elif char != close:
+                raise self.error(f'expected "," or {close!r}')
+
+    def dictionary(self) -> dict:
+        items = {}
+        while True:
+            self.skip()
+            if self.text[self.pos:self.pos + 1] == '}':
+                self.pos += 1
+                return items
+            key = self.value()
+            self.expect(':')
+            items[key] = self.value()
+            self.skip()
+            char = self.text[self.pos:self.pos + 1]
+            if char == ',':
+                self.pos += 1
+            elif char != '}':
+                raise self.error('expected "," or "}"')
+
+
+# Short values that repeat a lot, such as script references, are only parsed once.
+_value_cache: dict[str, object] = {}
+_EMPTY_LIST = object()
+_MAX_CACHED_LENGTH = 128
+
+
+def parse_value(text: str):
+    """
+    Parses a single value as written in a resource file.
+    """
+    if text[:1] in _NUMBER_STARTS:
+        # Most values are plain numbers.
+        try:
+            return float(text) if '.' in text or 'e' in text else int(text)
+        except ValueError:
+            pass
+
+    cached = _value_cache.get(text)
+    if cached is not None:
+        return [] if cached is _EMPTY_LIST else cached
+
+    value = _Parser(text).parse()
+    if len(text) <= _MAX_CACHED_LENGTH:
+        if value == [] and isinstance(value, list):
+            _value_cache[text] = _EMPTY_LIST
+        elif isinstance(value, (str, ResourceRef)):
+            _value_cache[text] = value
+    return value
+
+
+def parse_header(line: str) -> tuple[str, dict]:
+    """
+    Parses a section header such as [sub_resource type="Resource" id="..."] into its tag and attributes.
+    """
+    body = line.strip()[1:-1]
+    if '\\' not in body:
+        # Headers are key=value pairs, so without escapes splitting on quotes tells strings apart.
+        pieces = body.split('"')
+        tag, _, outside = pieces[0].partition(' ')
+        attributes = {}
+        for i in range(0, len(pieces), 2):
+            key = None
+            for word in (outside if i == 0 else pieces[i]).split():
+                key, _, value = word.partition('=')
+                if value:
+                    attributes[key] = parse_value(value)
+                    key = None
+            if key and i + 1 < len(pieces):
+                attributes[key] = pieces[i + 1]
+        return tag, attributes
+
+    parser = _Parser(body)
+    tag = parser.name()
+    attributes = {}
+    while True:
+        parser.skip()
+        if parser.pos >= len(parser.text):
+            return tag, attributes
+        key = parser.name()
+        parser.expect('=')
+        attributes[key] = parser.value()
+
+
+"""
+Reading
+"""
+
+
+def iter_sections(f: TextIO) -> Iterator[Section]:
+    """
+    Yields each section of a resource file as soon as it has been read.
+    Values spanning several lines are collected until their brackets are closed.
+    """
+    section = None
+    key = None
+    parts: list[str] = []
+    depth = 0
+
+    for line_number, line in enumerate(f, 1):
+        if key is not None:
+            # Continuing a value that spans several lines.
+            parts.append(line)
+            depth += get_depth_change(line)
+        elif line.startswith('['):
+            if section:
+                yield section
+            tag, attributes = parse_header(line)
+            section = Section(tag, attributes, {})
+            continue
+        elif line == '\n' or not line.strip() or line.startswith(';'):
+            continue
+        else:
+            key, sep, rest = line.partition('=')
+            if not sep or section is None:
+                raise ValueError(f'line {line_number}: expected a property or a section')
+            key = key.strip()
+            if ('(' in rest or '[' in rest or '{' in rest) and rest.strip() not in _value_cache:
+                parts = [rest]
+                depth = get_depth_change(rest)
+            else:
+                # The common case, a value known to fit on its line.
+                parts = None
+                depth = 0
+
+        if depth <= 0:
+            try:
+                section.properties[key] = parse_value(''.join(parts).strip() if parts else rest.strip())
+            except ValueError as e:
+                raise ValueError(f'line {line_number}: {key}: {e}') from None
+            key = None
+
+    if key is not None:
+        raise ValueError(f'unexpected end of file in {key}')
+    if section:
+        yield section
+
+
+def read_tres(f: TextIO) -> GoiseSongData:
+    """
+    Rebuilds the GoiseSongData held by a resource file, along with its tracks, notes and effects.
+    Resources keep the IDs they were written with, so writing them again keeps those too.
+    The tracks of a split song are only listed in `track_paths`, see `load_tres`.
+    """
+    song_data, uid, objects = _read_resources(f)
+    if not isinstance(song_data, GoiseSongData):
+        raise ValueError('no GoiseSongData resource found')
+
+    # Keep the file's identity, and keep new resources from taking the IDs already in use.
+    if uid:
+        song_data._uid = uid.removeprefix('uid://')
+    song_data.ids.reserve([obj._id for obj in objects.values()])
+    return song_data
+
+
+def read_track_tres(f: TextIO) -> GoiseTrack:
+    """
+    Rebuilds the GoiseTrack held by a track file of a split song, along with its notes and effects.
+    """
+    track, _, _ = _read_resources(f)
+    if not isinstance(track, GoiseTrack):
+        raise ValueError('no GoiseTrack resource found')
+    return track
+
+
+def _read_resources(f: TextIO) -> tuple[object, str, dict[str, object]]:
+    # Returns the main resource of a file, its uid and its subresources by ID.
+    ext_paths: dict[str, str] = {}
+    objects: dict[str, object] = {}
+    positions: dict[int, int] = {}  # by object identity, the order resources were defined in
+    uid = ''
+    main = None
+
+    for section in iter_sections(f):
+        if section.tag == 'gd_resource':
+            uid = section.attributes.get('uid', '')
+        elif section.tag == 'ext_resource':
+            ext_paths[section.attributes.get('id')] = section.attributes.get('path', '')
+        elif section.tag in ('sub_resource', 'resource'):
+            script = section.properties.get('script')
+            script_path = ''
+            if isinstance(script, ResourceRef):
+                script_path = script.target if script.kind == 'Resource' else ext_paths.get(script.target, '')
+            builder = _BUILDERS.get(os.path.basename(script_path))
+            if builder is None:
+                continue
+
+            obj = builder(section.properties, objects, positions)
+            if section.tag == 'resource':
+                main = obj
+            else:
+                resource_id = section.attributes.get('id', '')
+                obj._id = resource_id.removeprefix('Resource_')
+                objects[resource_id] = obj
+                positions[id(obj)] = len(positions)
+
+    return main, uid, objects
+
+
+def load_tres(filepath: str, load_tracks: bool = True) -> GoiseSongData:
+    """
+    Loads a song from a resource file. The tracks of a split song are loaded from
+    their own files as well, unless `load_tracks` is unset.
+    """
+    with open(filepath, encoding='utf-8') as f:
+        song_data = read_tres(f)
+    if load_tracks:
+        for _, path in song_data.track_paths:
+            with open(resolve_res_path(path, filepath), encoding='utf-8') as f:
+                song_data.add_track(read_track_tres(f))
+    return song_data
+
+
+def resolve_res_path(path: str, filepath: str) -> str:
+    """
+    Finds the file of a res:// path used by a resource file, through the project.godot above it.
+    Outside of a Godot project, track files are looked for where renot writes them,
+    in a directory named after the song next to it.
+    """
+    if not path.startswith('res://'):
+        return os.path.join(os.path.dirname(filepath), path)
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    while True:
+        if os.path.exists(os.path.join(directory, 'project.godot')):
+            return os.path.join(directory, path.removeprefix('res://'))
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return os.path.join(os.path.dirname(filepath), *path.split('/')[-2:])
+
+
+"""
+Building
+"""
+
+
+def _resolve(refs, objects: dict[str, object], kind: type) -> list:
+    return [
+        objects[ref.target] for ref in refs or ()
+        if isinstance(ref, ResourceRef) and isinstance(objects.get(ref.target), kind)
+    ]
+
+
+def _build_effect(properties: dict, objects: dict[str, object], positions: dict[int, int]) -> GoiseEffect:
+    effect = GoiseEffect()
+    effect.type = GoiseEffect.Type(int(properties.get('type', -1)) + 1)
+    effect.params = [float(param) for param in properties.get('params', ())]
+    return effect
+
+
+def _build_note(properties: dict, objects: dict[str, object], positions: dict[int, int]) -> GoiseNote:
+    note = GoiseNote(
+        Note(int(properties.get('note', 0))),
+        properties.get('beat', 0.0),
+        properties.get('end', 0.0),
+        properties.get('time', 0.0),
+        properties.get('end_time', 0.0),
+    )
+    note.effects = _resolve(properties.get('effects'), objects, GoiseEffect)
+    return note
+
+
+def _build_track(properties: dict, objects: dict[str, object], positions: dict[int, int]) -> GoiseTrack:
+    track = GoiseTrack(properties.get('name', 'Track'))
+    track.notes = _resolve(properties.get('notes'), objects, GoiseNote)
+    if track.notes:
+        # Notes are written in the order they were defined in before being sorted by beat,
+        # so keeping that order writes the same file again.
+        track.notes.sort(key=lambda note: positions[id(note)])
+    if not track.notes and properties.get('packed_notes'):
+        track.notes = _unpack_notes(properties)
+    return track
+
+
+def _unpack_notes(properties: dict) -> list[GoiseNote]:
+    """
+    Builds notes out of the packed arrays of a track, like GoiseTrack.unpack in the addon.
+    """
+    effect_offsets = properties.get('packed_effect_offsets') or [0]
+    effect_types = properties.get('packed_effect_types') or []
+    param_offsets = properties.get('packed_effect_param_offsets') or [0]
+    params = properties.get('packed_effect_params') or []
+
+    notes = []
+    for i, (step, beat, end, time, end_time) in enumerate(zip(
+        properties['packed_notes'], properties.get('packed_beats', ()), properties.get('packed_ends', ()),
+        properties.get('packed_times', ()), properties.get('packed_end_times', ()),
+    )):
+        note = GoiseNote(Note(step), beat, end, time, end_time)
+        for j in range(effect_offsets[i], effect_offsets[i + 1]):
+            effect = GoiseEffect()
+            effect.type = GoiseEffect.Type(effect_types[j] + 1)
+            effect.params = [float(param) for param in params[param_offsets[j]:param_offsets[j + 1]]]
+            note.add_effect(effect)
+        notes.append(note)
+    return notes
+
+
+def _build_song_data(properties: dict, objects: dict[str, object], positions: dict[int, int]) -> GoiseSongData:
+    song_data = GoiseSongData(
+        properties.get('song_path', ''),
+        dict(properties.get('bpm_map') or {}),
+        dict(properties.get('lpb_map') or {}),
+    )
+    song_data.tracks = _resolve(properties.get('tracks'), objects, GoiseTrack)
+    song_data.track_paths = list(zip(properties.get('track_names') or (), properties.get('track_paths') or ()))
+    return song_data
+
+
+_BUILDERS = {
+    'effect.gd': _build_effect,
+    'note.gd': _build_note,
+    'track.gd': _build_track,
+    'song_data.gd': _build_song_data,
+}
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    for filepath in sys.argv[1:]:
+        start = time.perf_counter()
+        song_data = load_tres(filepath)
+        elapsed = time.perf_counter() - start
+        notes = sum(len(track.notes) for track in song_data.tracks)
+        effects = sum(len(note.effects) for track in song_data.tracks for note in track.notes)
+        print(f'{filepath}: {len(song_data.tracks)} tracks, {notes} notes, {effects} effects in {elapsed * 1000:.1f} ms')
@@ -0,0 +1,239 @@
+"""
+This module waits for files to change on disk, so that renot can stay running
+and convert songs as soon as they are saved.
+
+On Linux inotify is used through ctypes, anywhere else the watched paths are polled.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterable
+
+# inotify event masks, see <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """
+    Returns libc if it provides inotify, None otherwise.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class Watcher:
+    """
+    Watches files and directories for changes.
+
+    A watched directory reports changes to any file directly inside it,
+    a watched file only reports changes to itself. Paths are reported normalized.
+    """
+
+    def __init__(self, paths: Iterable[str], poll_interval: float = 1.0, use_inotify: bool = True):
+        self.poll_interval: float = poll_interval
+
+        # Watched directories, and the files we care about in them (None for all of them).
+        self._dirs: dict[str, set[str] | None] = {}
+        for path in paths:
+            path = os.path.normpath(path)
+            if os.path.isdir(path):
+                self._dirs[path] = None
+            else:
+                directory, filename = os.path.split(path)
+                files = self._dirs.setdefault(directory or os.curdir, set())
+                if files is not None:
+                    files.add(filename)
+
+        self._fd: int | None = None
+        self._wds: dict[int, str] = {}
+        self._snapshot: dict[str, tuple[int, int]] = {}
+
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            self._start_inotify(libc)
+        if self._fd is None:
+            self._snapshot = self._scan()
+
+    @property
+    def using_inotify(self) -> bool:
+        return self._fd is not None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Waiting
+    """
+
+    def wait(self, debounce: float = 0.5) -> set[str]:
+        """
+        Blocks until something changes, then keeps collecting changes until nothing
+        has changed for `debounce` seconds. Saving a song tends to touch it several
+        times in a row, this turns such a burst into a single set of paths.
+        """
+        changed = set()
+        while not changed:
+            changed = self.changes(None)
+
+        while more := self.changes(debounce):
+            changed |= more
+        return changed
+
+    def changes(self, timeout: float | None = None) -> set[str]:
+        """
+        Returns the paths that changed, waiting up to `timeout` seconds (forever if None)
+        for at least one of them.
+        """
+        if self._fd is not None:
+            return self._read_inotify(timeout)
+        return self._poll(timeout)
+
+    """
+    inotify
+    """
+
+    def _start_inotify(self, libc):
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+
+        for directory in self._dirs:
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                # Missing directories and exhausted watch limits are left to polling.
+                os.close(fd)
+                self._wds.clear()
+                return
+            self._wds[wd] = directory
+
+        self._fd = fd
+
+    def _read_inotify(self, timeout: float | None) -> set[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                filename = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, so anything could have changed.
+                    changed |= self._all_paths()
+                elif wd in self._wds and filename:
+                    path = self._match(self._wds[wd], filename)
+                    if path:
+                        changed.add(path)
+        return changed
+
+    """
+    Polling
+    """
+
+    def _poll(self, timeout: float | None) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                path for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+            if deadline is None:
+                time.sleep(self.poll_interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.poll_interval, remaining))
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for path in self._all_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    """
+    Paths
+    """
+
+    def _all_paths(self) -> set[str]:
+        paths = set()
+        for directory, files in self._dirs.items():
+            if files is not None:
+                paths.update(self._join(directory, filename) for filename in files)
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    paths.update(self._join(directory, entry.name) for entry in entries if entry.is_file())
+            except OSError:
+                pass
+        return paths
+
+    def _match(self, directory: str, filename: str) -> str | None:
+        files = self._dirs[directory]
+        if files is None or filename in files:
+            return self._join(directory, filename)
+        return None
+
+    @staticmethod
+    def _join(directory: str, filename: str) -> str:
+        # Files of the current directory are watched through os.curdir, but reported without it.
+        return os.path.normpath(os.path.join(directory, filename))
+
+
+if __name__ == '__main__':
+    with Watcher(sys.argv[1:] or [os.curdir]) as watcher:
+        print('using inotify' if watcher.using_inotify else 'polling')
+        while True:
+            print(sorted(watcher.wait()))
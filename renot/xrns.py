@@ -1,18 +1,177 @@
+from array import array
 from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from io import BytesIO
+from itertools import repeat
+from typing import BinaryIO
 from zipfile import ZipFile
+import time
 import xml.etree.ElementTree as ET
 from xml.etree.ElementTree import Element
 
+from .note import Note
+
+# Below this many bytes of patterns, starting workers costs more than parsing them here.
+PARALLEL_PATTERN_BYTES = 1 << 20
+
+# Special note steps for pattern data.
+NOTE_OFF = -1
+NOTE_EMPTY = -2
+
+# Volume or panning column that is empty or holds a command instead of a value.
+VALUE_EMPTY = 0xFFFF
+
+# Lookup tables for the strings pattern data is made of, so that decoding
+# a column is mostly dictionary lookups. Anything else falls back to parsing.
+NOTE_STEPS: dict[str, int] = dict(Note.names, OFF=NOTE_OFF)
+HEX_VALUES: dict[str, int] = {f'{i:02X}': i for i in range(256)} | {f'{i:02x}': i for i in range(256)}
+
+# Step of a note column without a note.
+DEFAULT_STEP = NOTE_STEPS['C-5']
+
+
+def note_string_to_step(note: str) -> int:
+    """
+    Decodes a pattern note name such as 'C-4' or 'OFF' into a note step.
+    """
+    step = NOTE_STEPS.get(note)
+    if step is not None:
+        return step
+    try:
+        return Note.from_string(note).step
+    except (ValueError, IndexError):
+        return NOTE_EMPTY
+
+
+def parse_hex(text: str | None, default: int) -> int:
+    """
+    Decodes a hex pattern value, or returns `default` if there is none.
+    """
+    value = HEX_VALUES.get(text)
+    if value is not None:
+        return value
+    try:
+        return int(text, 16)
+    except (TypeError, ValueError):
+        return default
+
+
+def step_to_note_string(step: int) -> str:
+    if step == NOTE_OFF:
+        return 'OFF'
+    if step == NOTE_EMPTY:
+        return '---'
+    return Note(step).to_string()
+
+
+def encode_effect_number(number: str) -> int:
+    """
+    Packs a two character effect number such as '0A' or 'ZT' into an int.
+    Zero is reserved for no effect.
+    """
+    number = number.rjust(2, '0')
+    return (ord(number[0]) << 8) | ord(number[1])
+
+
+def decode_effect_number(number: int) -> str:
+    return chr(number >> 8) + chr(number & 0xFF)
+
+
+class _TimedReader:
+    """
+    Wraps a binary file, adding up the time spent in its reads.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self.seconds: float = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        start = time.perf_counter()
+        data = self._f.read(size)
+        self.seconds += time.perf_counter() - start
+        return data
+
+
+def split_patterns(song_xml: bytes) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    Cuts the patterns out of a Song.xml document without parsing it.
+    Returns the document without them, along with the byte range of every pattern in order.
+    """
+    pool = song_xml.find(b'<PatternPool')
+    start = song_xml.find(b'<Patterns>', pool) if pool >= 0 else -1
+    if start < 0:
+        return song_xml, []
+    start += len(b'<Patterns>')
+    end = song_xml.find(b'</Patterns>', start)
+
+    # Patterns never hold other patterns, only tags that start the same way like <PatternTrack>.
+    ranges = []
+    i = song_xml.find(b'<Pattern', start, end)
+    while i >= 0:
+        tag_end = song_xml.find(b'>', i, end)
+        if song_xml[i + len(b'<Pattern')] not in b'>/ \t\r\n':
+            raise ValueError(f'unexpected element in patterns at byte {i}')
+        if song_xml[tag_end - 1] == ord('/'):
+            last = tag_end + 1
+        else:
+            last = song_xml.find(b'</Pattern>', tag_end, end) + len(b'</Pattern>')
+        ranges.append((i, last))
+        i = song_xml.find(b'<Pattern', last, end)
+    return song_xml[:start] + song_xml[end:], ranges
+
+
+def get_batches(ranges: list[tuple[int, int]], count: int) -> list[tuple[int, int]]:
+    """
+    Groups consecutive byte ranges into at most `count` ranges of about the same size.
+    """
+    if not ranges:
+        return []
+    total = ranges[-1][1] - ranges[0][0]
+    batches = []
+    first = ranges[0][0]
+    for i, (_, last) in enumerate(ranges):
+        if last - ranges[0][0] >= total * (len(batches) + 1) / count or i == len(ranges) - 1:
+            batches.append((first, last))
+            if i + 1 < len(ranges):
+                first = ranges[i + 1][0]
+    return batches
+
+
+def parse_patterns(patterns_xml: bytes, selection: tuple[set[int] | None, set[int] | None]) -> list['Pattern']:
+    """
+    Parses consecutive <Pattern> elements cut out by `split_patterns`,
+    with the track and instrument indices given by `XrnsFile._get_selection`.
+    """
+    root = ET.fromstring(b'<Patterns>' + patterns_xml + b'</Patterns>')
+    return [Pattern(element, *selection) for element in root]
+
 
 class XrnsFile:
     """
     Provides a data interface for an .xrns project file.
+
+    Loading can be limited to what is actually needed. Only tracks selected by `tracks`
+    (indices, names, or a predicate on Track) get their note columns loaded, other tracks only
+    keep their effects, in effect columns as well as note columns. Only notes of instruments in
+    `instruments` (indices or names) are loaded, although note offs, columns without an instrument
+    and the effects of every column are always kept.
     """
 
-    def __init__(self, filepath: str | None = None):
+    def __init__(self,
+                 filepath: str | bytes | BinaryIO | None = None,
+                 stream: bool = False,
+                 tracks: Iterable[int | str] | Callable[['Track'], bool] | None = None,
+                 instruments: Iterable[int | str] | None = None,
+                 pattern_jobs: int = 1):
         # Constants.
         self._root = None
         self._filepath = ''
+        self._track_filter = tracks
+        self._instrument_filter = instruments
+
+        # Seconds spent on each stage of the last load.
+        self.timings: dict[str, float] = {}
 
         # Song properties.
         self.global_song_data: GlobalSongData | None = None
@@ -23,16 +182,53 @@ class XrnsFile:
 
         # Load files.
         if filepath:
-            self.load(filepath)
+            self.load(filepath, stream=stream, pattern_jobs=pattern_jobs)
+
+    def load(self, filepath: str | bytes | BinaryIO, stream: bool = False, pattern_jobs: int = 1):
+        """
+        Loads an .xrns project file, given by path, as the bytes of the file or as a binary file object.
+
+        By default the whole Song.xml tree is built and kept around as `_root`.
+        With `stream` set, the document is instead parsed incrementally and each
+        section is processed and discarded as soon as its element closes, so
+        peak memory stays bounded by a single pattern rather than the whole song.
 
-    def load(self, filepath: str):
-        if self._root:
+        With `pattern_jobs` above one, patterns are instead cut out of the document as bytes
+        and parsed by that many processes, while the rest of the document is parsed here.
+
+        Afterwards `timings` holds the seconds spent reading the zip,
+        parsing the XML and building the model out of it.
+        """
+        if self._filepath:
             self.clear()
 
         self._filepath = filepath
+        if isinstance(filepath, (bytes, bytearray)):
+            self._filepath = '<bytes>'
+            filepath = BytesIO(filepath)
+        if pattern_jobs > 1:
+            self._load_parallel(filepath, pattern_jobs)
+        elif stream:
+            self._load_stream(filepath)
+        else:
+            self._load_tree(filepath)
+
+    def _load_tree(self, filepath: str | BinaryIO):
+        start = time.perf_counter()
         with ZipFile(filepath) as z:
-            self._root = ET.fromstring(z.read('Song.xml'))
+            song_xml = z.read('Song.xml')
+        read_time = time.perf_counter()
+        self._root = ET.fromstring(song_xml)
+        parse_time = time.perf_counter()
+        self._process_root(self._root)
+
+        self.timings = {
+            'zip read': read_time - start,
+            'xml parse': parse_time - read_time,
+            'model build': time.perf_counter() - parse_time,
+        }
 
+    def _process_root(self, root: Element):
         tag_to_func = {
             'GlobalSongData':  self._process_global_song_data,
             'Instruments':     self._process_instruments,
@@ -41,14 +237,107 @@ class XrnsFile:
             'PatternSequence': self._process_pattern_sequence,
         }
 
-        for child in self._root:
+        for child in root:
             func = tag_to_func.get(child.tag)
             if func:
                 func(child)
 
+    def _load_parallel(self, filepath: str | BinaryIO, jobs: int):
+        # Everything but the patterns is parsed first, which resolves the track and instrument filters.
+        start = time.perf_counter()
+        with ZipFile(filepath) as z:
+            song_xml = z.read('Song.xml')
+        read_time = time.perf_counter()
+        skeleton, ranges = split_patterns(song_xml)
+        root = ET.fromstring(skeleton)
+        parse_time = time.perf_counter()
+        self._process_root(root)
+        build_time = time.perf_counter()
+
+        # Workers get consecutive patterns in a few batches each, to balance them without
+        # paying for a round trip per pattern, and hand back their typed arrays.
+        size = ranges[-1][1] - ranges[0][0] if ranges else 0
+        batches = get_batches(ranges, jobs * 4 if size >= PARALLEL_PATTERN_BYTES else 1)
+        if len(batches) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(jobs, len(batches))) as executor:
+                results = executor.map(
+                    parse_patterns,
+                    (song_xml[first:last] for first, last in batches),
+                    repeat(self._get_selection()),
+                )
+                self.patterns = [pattern for patterns in results for pattern in patterns]
+        else:
+            self.patterns = [
+                pattern for first, last in batches
+                for pattern in parse_patterns(song_xml[first:last], self._get_selection())
+            ]
+
+        self.timings = {
+            'zip read': read_time - start,
+            'xml parse': parse_time - read_time,
+            'model build': build_time - parse_time,
+            'pattern parse': time.perf_counter() - build_time,
+        }
+
+    def _load_stream(self, filepath: str | BinaryIO):
+        # Elements are dispatched by their tag path below the root, '*' matching any tag.
+        # Each handler receives a fully closed element that is discarded right after.
+        path_to_func = {
+            ('GlobalSongData',):                    self._process_global_song_data,
+            ('Instruments', 'Instrument'):          self._process_instrument,
+            ('Tracks', '*'):                        self._process_track,
+            ('PatternPool', 'Patterns', 'Pattern'): self._process_pattern,
+            ('PatternSequence',):                   self._process_pattern_sequence,
+        }
+
+        def get_func(path: tuple[str, ...]):
+            return path_to_func.get(path) or path_to_func.get(path[:-1] + ('*',))
+
+        # Reading, parsing and building are interleaved, so reads and handlers are timed
+        # as they happen and parsing gets whatever is left.
+        start = time.perf_counter()
+        build_time = 0.0
+        with ZipFile(filepath) as z, z.open('Song.xml') as f:
+            reader = _TimedReader(f)
+            tags: list[str] = []
+            parents: list[Element] = []
+            capture = 0  # depth of the element being collected for a handler
+            for event, element in ET.iterparse(reader, events=('start', 'end')):
+                if event == 'start':
+                    tags.append(element.tag)
+                    parents.append(element)
+                    if not capture and get_func(tuple(tags[1:])):
+                        capture = len(tags)
+                    continue
+
+                depth = len(tags)
+                if depth == capture:
+                    func_start = time.perf_counter()
+                    get_func(tuple(tags[1:]))(element)
+                    build_time += time.perf_counter() - func_start
+                    capture = 0
+
+                tags.pop()
+                parents.pop()
+                if capture or not parents:
+                    # Either part of a subtree still being collected, or the root itself.
+                    continue
+
+                # Nothing needs this subtree anymore, so detach it from the document.
+                element.clear()
+                parents[-1].remove(element)
+
+        self.timings = {
+            'zip read': reader.seconds,
+            'xml parse': time.perf_counter() - start - reader.seconds - build_time,
+            'model build': build_time,
+        }
+
     def clear(self):
         self._root = None
         self._filepath = ''
+        self.timings = {}
         self.global_song_data = None
         self.instruments = []
         self.tracks = []
@@ -68,11 +357,44 @@ class XrnsFile:
     def _process_instruments(self, element: Element):
         self.instruments = [Instrument(e) for e in element]
 
+    def _process_instrument(self, element: Element):
+        self.instruments.append(Instrument(element))
+
     def _process_tracks(self, element: Element):
         self.tracks = [Track(e) for e in element]
 
+    def _process_track(self, element: Element):
+        self.tracks.append(Track(element))
+
     def _process_pattern_pool(self, element: Element):
-        self.patterns = [Pattern(e) for e in element.find('Patterns')]
+        track_indices, instrument_indices = self._get_selection()
+        self.patterns = [Pattern(e, track_indices, instrument_indices) for e in element.find('Patterns')]
+
+    def _process_pattern(self, element: Element):
+        self.patterns.append(Pattern(element, *self._get_selection()))
+
+    def _get_selection(self) -> tuple[set[int] | None, set[int] | None]:
+        """
+        Resolves the track and instrument filters into indices.
+        A filter that can't be resolved yet selects everything.
+        """
+        track_indices = None
+        if self._track_filter is not None and self.tracks:
+            if callable(self._track_filter):
+                track_indices = {i for i, track in enumerate(self.tracks) if self._track_filter(track)}
+            else:
+                track_indices = self._get_indices(self._track_filter, [track.name for track in self.tracks])
+
+        instrument_indices = None
+        if self._instrument_filter is not None and self.instruments:
+            instrument_indices = self._get_indices(self._instrument_filter, [inst.name for inst in self.instruments])
+
+        return track_indices, instrument_indices
+
+    @staticmethod
+    def _get_indices(selection: Iterable[int | str], names: list[str]) -> set[int]:
+        selection = set(selection)
+        return {i for i, name in enumerate(names) if i in selection or name in selection}
 
     def _process_pattern_sequence(self, element: Element):
         self.pattern_sequence = PatternSequence(element)
@@ -106,91 +428,259 @@ class Track:
 
 
 class Pattern:
+    """
+    Pattern data is stored column-wise per track, with one typed array per field.
+    The Note, Line and Effect classes are thin views over those arrays.
+    """
 
     class Effect:
 
+        __slots__ = ('number', 'value')
+
         def __init__(self, number: str, value: int):
             self.number: str = number
             self.value: int = value
 
         @classmethod
         def from_element(cls, element: Element):
-            number_element = element.find('number')
-            value_element = element.find('value')
-            number = number_element.text if number_element else '00'
-            value = int(value_element.text, 16) if value_element else 0
+            number = '00'
+            value = 0
+            for child in element:
+                if child.tag == 'Value':
+                    value = parse_hex(child.text, 0)
+                elif child.tag == 'Number':
+                    number = child.text
             return cls(number, value)
 
     class Note:
 
-        def __init__(self, element: Element):
-            note_element = element.find('Note')
-            inst_element = element.find('Instrument')
-            vol_element  = element.find('Volume')
-            pan_element  = element.find('Panning')
-            del_element  = element.find('Delay')
-            fxn_element  = element.find('EffectNumber')
-            fxv_element  = element.find('EffectValue')
-
-            if note_element is not None:
-                self.note: str = note_element.text
-            else:
-                self.note: str = 'C-5'
-            self.note = self.note.replace('-', '')
-
-            self.instrument: int = int(inst_element.text, 16) if inst_element is not None else -1
-
-            try:
-                self.volume: int = int(vol_element.text, 16) if vol_element is not None else 127
-            except ValueError:
-                self.volume = 128
-
-            try:
-                self.panning: int = int(pan_element.text, 16) if pan_element is not None else 64
-            except ValueError:
-                self.panning = 64
-
-            try:
-                self.delay: int = int(del_element.text, 16) if del_element is not None else 0
-            except ValueError:
-                self.delay = 0
-
-            if fxn_element:
-                self.effect: Pattern.Effect | None = Pattern.Effect(
-                    number=fxn_element.text,
-                    value=int(fxv_element.text, 16) if fxv_element else 0
-                )
-            else:
-                self.effect: Pattern.Effect | None = None
+        __slots__ = ('_track', '_index')
+
+        def __init__(self, track: 'Pattern.PatternTrack', index: int):
+            self._track = track
+            self._index = index
+
+        @property
+        def note(self) -> str:
+            return step_to_note_string(self.step)
+
+        @property
+        def step(self) -> int:
+            return self._track.step[self._index]
+
+        @property
+        def instrument(self) -> int:
+            return self._track.instrument[self._index]
+
+        @property
+        def volume(self) -> int:
+            volume = self._track.volume[self._index]
+            return 127 if volume == VALUE_EMPTY else volume
+
+        @property
+        def panning(self) -> int:
+            panning = self._track.panning[self._index]
+            return 64 if panning == VALUE_EMPTY else panning
+
+        @property
+        def delay(self) -> int:
+            return self._track.delay[self._index]
+
+        @property
+        def effect(self) -> 'Pattern.Effect | None':
+            number = self._track.effect_number[self._index]
+            if not number:
+                return None
+            return Pattern.Effect(decode_effect_number(number), self._track.effect_value[self._index])
 
     class Line:
 
-        def __init__(self, element: Element):
-            notes_element = element.find('NoteColumns')
-            effects_element = element.find('EffectColumns')
+        __slots__ = ('_track', '_notes', '_effects')
 
-            self.notes: list[Pattern.Note] = [
-                Pattern.Note(e)
-                for e in notes_element
-            ] if notes_element else []
-            self.effects: list[Pattern.Effect] = [
-                Pattern.Effect.from_element(e)
-                for e in effects_element
-            ] if effects_element else []
+        def __init__(self, track: 'Pattern.PatternTrack', notes: range, effects: range):
+            self._track = track
+            self._notes = notes
+            self._effects = effects
+
+        @property
+        def notes(self) -> list['Pattern.Note']:
+            return [Pattern.Note(self._track, i) for i in self._notes]
+
+        @property
+        def effects(self) -> list['Pattern.Effect']:
+            track = self._track
+            return [
+                Pattern.Effect(decode_effect_number(track.fx_number[i]), track.fx_value[i])
+                for i in self._effects
+            ]
 
     class PatternTrack:
 
-        def __init__(self, element: Element):
-            self.lines: dict[int, Pattern.Line] = OrderedDict()
-            if lines := element.find('Lines'):
+        __slots__ = (
+            'line', 'column', 'step', 'instrument', 'volume', 'panning', 'delay', 'effect_number', 'effect_value',
+            'fx_line', 'fx_column', 'fx_number', 'fx_value',
+        )
+
+        def __init__(self, element: Element | None = None, notes: bool = True, instruments: set[int] | None = None):
+            # Note columns, in line then column order.
+            self.line = array('H')
+            self.column = array('B')
+            self.step = array('h')
+            self.instrument = array('h')
+            self.volume = array('H')
+            self.panning = array('H')
+            self.delay = array('H')
+            self.effect_number = array('H')
+            self.effect_value = array('H')
+
+            # Effect columns, in line then column order.
+            self.fx_line = array('H')
+            self.fx_column = array('B')
+            self.fx_number = array('H')
+            self.fx_value = array('H')
+
+            if element is not None and (lines := element.find('Lines')) is not None:
                 for child in lines:
-                    index = int(child.attrib.get('index', 0))
-                    self.lines[index] = Pattern.Line(child)
-
-    def __init__(self, element: Element):
+                    self._add_line(child, notes, instruments)
+
+        def _add_line(self, element: Element, notes: bool = True, instruments: set[int] | None = None):
+            index = int(element.attrib.get('index', 0))
+
+            for columns in element:
+                tag = columns.tag
+                if tag == 'NoteColumns':
+                    if notes:
+                        for column, note_element in enumerate(columns):
+                            if len(note_element):
+                                self._add_note(index, column, note_element, instruments)
+                    else:
+                        for column, note_element in enumerate(columns):
+                            if len(note_element):
+                                self._add_note_effect(index, column, note_element)
+                elif tag == 'EffectColumns':
+                    for column, effect_element in enumerate(columns):
+                        if len(effect_element):
+                            self._add_effect(index, column, effect_element)
+
+        def _add_note(self, index: int, column: int, element: Element, instruments: set[int] | None = None):
+            step = DEFAULT_STEP
+            instrument = -1
+            volume = panning = VALUE_EMPTY
+            delay = 0
+            effect_number = effect_value = 0
+
+            # A single pass over the fields, most of which decode with one lookup.
+            for child in element:
+                tag = child.tag
+                text = child.text
+                if tag == 'Note':
+                    step = NOTE_STEPS.get(text)
+                    if step is None:
+                        step = note_string_to_step(text)
+                elif tag == 'Instrument':
+                    instrument = HEX_VALUES.get(text)
+                    if instrument is None:
+                        instrument = parse_hex(text, -1)
+                elif tag == 'Volume':
+                    volume = HEX_VALUES.get(text)
+                    if volume is None:
+                        volume = parse_hex(text, VALUE_EMPTY)
+                elif tag == 'Panning':
+                    panning = HEX_VALUES.get(text)
+                    if panning is None:
+                        panning = parse_hex(text, VALUE_EMPTY)
+                elif tag == 'Delay':
+                    delay = HEX_VALUES.get(text)
+                    if delay is None:
+                        delay = parse_hex(text, 0)
+                elif tag == 'EffectNumber':
+                    effect_number = encode_effect_number(text)
+                elif tag == 'EffectValue':
+                    effect_value = HEX_VALUES.get(text)
+                    if effect_value is None:
+                        effect_value = parse_hex(text, 0)
+
+            if not effect_number:
+                effect_value = 0
+
+            if instruments is not None and instrument >= 0 and instrument not in instruments and step != NOTE_OFF:
+                # Only remember that another instrument took over this column, along with its
+                # effect, which may still change the tempo. Note offs always end the playing note.
+                self._append_note(index, column, NOTE_EMPTY, instrument, VALUE_EMPTY, VALUE_EMPTY, 0,
+                                  effect_number, effect_value)
+                return
+
+            self._append_note(index, column, step, instrument, volume, panning, delay, effect_number, effect_value)
+
+        def _add_note_effect(self, index: int, column: int, element: Element):
+            # Only the effect of a note column of a track that isn't loaded, which may still change the tempo.
+            effect_number = effect_value = 0
+            for child in element:
+                if child.tag == 'EffectNumber':
+                    effect_number = encode_effect_number(child.text)
+                elif child.tag == 'EffectValue':
+                    effect_value = HEX_VALUES.get(child.text)
+                    if effect_value is None:
+                        effect_value = parse_hex(child.text, 0)
+            if effect_number:
+                self._append_note(index, column, NOTE_EMPTY, -1, VALUE_EMPTY, VALUE_EMPTY, 0,
+                                  effect_number, effect_value)
+
+        def _add_effect(self, index: int, column: int, element: Element):
+            number = '00'
+            value = 0
+            for child in element:
+                if child.tag == 'Value':
+                    value = HEX_VALUES.get(child.text)
+                    if value is None:
+                        value = parse_hex(child.text, 0)
+                elif child.tag == 'Number':
+                    number = child.text
+            self.fx_line.append(index)
+            self.fx_column.append(column)
+            self.fx_number.append(encode_effect_number(number))
+            self.fx_value.append(value)
+
+        def _append_note(self, index: int, column: int, step: int, instrument: int, volume: int, panning: int,
+                         delay: int, effect_number: int, effect_value: int):
+            self.line.append(index)
+            self.column.append(column)
+            self.step.append(step)
+            self.instrument.append(instrument)
+            self.volume.append(volume)
+            self.panning.append(panning)
+            self.delay.append(delay)
+            self.effect_number.append(effect_number)
+            self.effect_value.append(effect_value)
+
+        @property
+        def lines(self) -> dict[int, 'Pattern.Line']:
+            # Group both column types by line, which are already in line order.
+            note_bounds = self._get_line_bounds(self.line)
+            fx_bounds = self._get_line_bounds(self.fx_line)
+            empty = range(0)
+            return OrderedDict(
+                (index, Pattern.Line(self, note_bounds.get(index, empty), fx_bounds.get(index, empty)))
+                for index in sorted(note_bounds.keys() | fx_bounds.keys())
+            )
+
+        @staticmethod
+        def _get_line_bounds(lines: array) -> dict[int, range]:
+            bounds: dict[int, range] = {}
+            start = 0
+            for i in range(1, len(lines) + 1):
+                if i == len(lines) or lines[i] != lines[start]:
+                    bounds[lines[start]] = range(start, i)
+                    start = i
+            return bounds
+
+    __slots__ = ('lines', 'tracks')
+
+    def __init__(self, element: Element, track_indices: set[int] | None = None, instrument_indices: set[int] | None = None):
         self.lines: int = int(element.find('NumberOfLines').text)
         self.tracks: list[Pattern.PatternTrack] = [
-            Pattern.PatternTrack(e) for e in element.find('Tracks')
+            Pattern.PatternTrack(e, notes=track_indices is None or i in track_indices, instruments=instrument_indices)
+            for i, e in enumerate(element.find('Tracks'))
         ]
 
 